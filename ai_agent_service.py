@@ -8,6 +8,7 @@ AIAgentService - микросервис поиска с помощью ИИ (Yan
 import logging
 import json
 import re
+import time
 from typing import List, Dict, Any
 from decouple import config
 from django.db import connection
@@ -29,6 +30,11 @@ class AIAgentService:
         self.is_available = bool(self.api_key and self.folder_id)
         self.service_cache = None
         self.service_list = None
+        self.services_prompt_text = ""  # Блок списка услуг для промпта, собирается один раз при загрузке
+        # ДОБАВЛЕНО: Экземпляр живет весь процесс (общий обработчик в views), поэтому список услуг
+        # перечитывается из services_catalog по TTL, а не один раз на все время работы
+        self.services_cache_ttl = 300  # Секунд до перезагрузки списка услуг
+        self._services_loaded_at = 0.0
 
         # Статистика использования
         self.total_tokens_used = 0
@@ -63,12 +69,25 @@ class AIAgentService:
 
             self.service_cache = await sync_to_async(load_sync)()
             self.service_list = self.service_cache  # Используем тот же список
+            # Список услуг в промпте не зависит от сообщения - форматируем его один раз
+            self.services_prompt_text = "\n".join([
+                f"{i+1}. [ID: {s['id']}] {s['name']} - {s['description']}"
+                for i, s in enumerate(self.service_cache)
+            ])
+            self._services_loaded_at = time.monotonic()
             logger.info(f"AIAgentService: загружено {len(self.service_list)} услуг для ИИ анализа")
 
         except Exception as e:
             logger.error(f"Ошибка загрузки услуг: {e}")
-            self.service_cache = []
+            # Неудачную загрузку не кэшируем: следующий запрос попробует снова
+            self.service_cache = None
             self.service_list = []
+            self.services_prompt_text = ""
+
+    async def ensure_services_loaded(self) -> None:
+        """Загружает список услуг, если он еще не загружен или устарел (services_cache_ttl)"""
+        if self.service_cache is None or time.monotonic() - self._services_loaded_at > self.services_cache_ttl:
+            await self._load_services()
 
     def _create_service_detection_prompt(self, message_text: str) -> str:
         """
@@ -83,10 +102,7 @@ class AIAgentService:
         if not self.service_cache:
             return ""
 
-        services_text = "\n".join([
-            f"{i+1}. [ID: {s['id']}] {s['name']} - {s['description']}"
-            for i, s in enumerate(self.service_cache)
-        ])
+        services_text = self.services_prompt_text
 
         prompt = f"""
 Ты - опытный диспетчер управляющей компании. Твоя задача - понять проблему человека и определить нужную услугу.
@@ -240,9 +256,8 @@ JSON:"""
                 logger.warning("AIAgent: недоступен (нет API ключа)")
                 return {'candidates': [], 'status': 'unavailable'}
 
-            # Загружаем услуги если еще не загружены
-            if self.service_cache is None:
-                await self._load_services()
+            # Загружаем услуги если еще не загружены или список устарел
+            await self.ensure_services_loaded()
 
             if not self.service_cache:
                 logger.warning("AIAgent: нет загруженных услуг")
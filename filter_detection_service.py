@@ -16,7 +16,10 @@ FilterDetectionService - микросервис определения филь
 
 import logging
 import json
-from typing import Dict, List, Optional
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -34,21 +37,66 @@ class FilterDetectionService:
         self.ai_agent = ai_agent_service
         self.is_available = ai_agent_service is not None
 
+        # ДОБАВЛЕНО: Короткий кэш успешных ответов LLM на повторы того же сообщения
+        # с той же историей (переспросы в цикле уточнения): ключ _make_cache_key -> результат
+        self.result_cache = TTLCache(ttl=60, max_size=512)
+
         logger.info(f"FilterDetectionService инициализирован (доступен: {self.is_available})")
 
-    def _create_filter_detection_prompt(self, message_text: str, dialog_history: List[Dict]) -> str:
+    def _make_cache_key(self, message_text: str, dialog_history: List[Dict], candidates: Optional[List[Dict]] = None) -> Tuple:
+        """
+        Ключ кэша: нормализованное сообщение, хвост истории (те же 5 сообщений,
+        что попадают в промпт) и ID кандидатов для ранжирования
+        """
+        message_hash = hashlib.blake2b(message_text.strip().lower().encode('utf-8'), digest_size=16).hexdigest()
+        history_hash = hashlib.blake2b(digest_size=16)
+        for msg in (dialog_history or [])[-5:]:
+            history_hash.update(f"{msg.get('role')}\x1f{msg.get('text', '')}\x1e".encode('utf-8'))
+        candidate_ids = tuple(c.get('service_id') for c in candidates) if candidates else ()
+        return message_hash, history_hash.hexdigest(), candidate_ids
+
+    def _format_candidates_list(self, candidates: List[Dict]) -> str:
+        """
+        Список кандидатов для промпта: одна строка на услугу с ID и названием,
+        категория и локация добавляются если уже загружены
+        """
+        candidates_list = ""
+        for i, c in enumerate(candidates, 1):
+            name = c.get('service_name', c.get('scenario_name', 'Unknown'))
+            line = f"{i}. ID:{c.get('service_id')} | {name}"
+            if c.get('category'):
+                line += f" | Категория:{c['category']}"
+            if c.get('location_type'):
+                line += f" | Локация:{c['location_type']}"
+            candidates_list += line + "\n"
+        return candidates_list
+
+    def _create_filter_detection_prompt(self, message_text: str, dialog_history: List[Dict], candidates: Optional[List[Dict]] = None) -> str:
         """
         Создание промпта для определения фильтров
 
+        Если переданы candidates - в тот же промпт добавляется выбор наиболее
+        подходящей услуги (recommended_id), чтобы не делать второй вызов LLM
+
         Returns:
             str: Промпт для YandexGPT
         """
         # Формируем историю диалога для контекста
-        history_text = ""
-        if dialog_history:
-            for msg in dialog_history[-5:]:  # Последние 5 сообщений
-                role = "Пользователь" if msg.get('role') == 'user' else "Бот"
-                history_text += f"{role}: {msg.get('text', '')}\n"
+        # Последние 5 сообщений, строка собирается одним join вместо конкатенации в цикле
+        history_text = "".join(
+            f"{'Пользователь' if msg.get('role') == 'user' else 'Бот'}: {msg.get('text', '')}\n"
+            for msg in (dialog_history or [])[-5:]
+        )
+
+        candidates_section = ""
+        ranking_fields = ""
+        if candidates:
+            candidates_section = f"""
+ДОСТУПНЫЕ УСЛУГИ (выбери из них ТОЛЬКО ОДНУ наиболее подходящую):
+{self._format_candidates_list(candidates)}"""
+            ranking_fields = """
+    "recommended_id": ТОЛЬКО число из колонки "ID:" в списке услуг выше,
+    "ranking_confidence": 0.5-1.0,"""
 
         prompt = f"""Ты - опытный диспетчер управляющей компании. Проанализируй обращение и определи фильтры для поиска услуги.
 
@@ -56,6 +104,7 @@ class FilterDetectionService:
 {history_text}
 
 Текущее сообщение: "{message_text}"
+{candidates_section}
 
 ВАЖНО: Если в истории есть предыдущие сообщения пользователя, ОБЪЕДИ их с текущим для понимания контекста!
 Например, если пользователь сказал "у меня течет", а потом "в ванной" - рассматривай как "у меня течет в ванной".
@@ -65,7 +114,7 @@ class FilterDetectionService:
     "incident_type": "Инцидент" или "Запрос",
     "location_type": "Индивидуальное" или "Общедомовое",
     "category": "Водоснабжение" или "Канализация" или "Отопление" или "Электричество" или "Конструктив" или "Лифты" или "Санитария" или "Озеленение" или "Ремонт МАФ и покрытий",
-    "object_description": "МАКСИМУМ 3 СЛОВА - объект+действие+место (пример: 'течь труба ванная', 'слабый напор кран')",
+    "object_description": "МАКСИМУМ 3 СЛОВА - объект+действие+место (пример: 'течь труба ванная', 'слабый напор кран')",{ranking_fields}
     "confidence": 0.0-1.0,
     "reason": "обоснование выбора"
 }}
@@ -156,6 +205,12 @@ JSON:"""
                     'error': 'Service unavailable'
                 }
 
+            cache_key = self._make_cache_key(message_text, dialog_history)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info("FilterDetectionService: фильтры взяты из кэша")
+                return cached
+
             # Создаем промпт
             prompt = self._create_filter_detection_prompt(message_text, dialog_history or [])
             logger.info(f"FilterDetectionService: отправляем промпт через AIAgentService (длина: {len(prompt)} символов)")
@@ -198,13 +253,120 @@ JSON:"""
                 f"confidence={confidence}"
             )
 
-            return {
+            result = {
                 'status': 'success',
                 'filters': filters,
                 'confidence': confidence,
                 'reason': reason,
                 'usage_info': usage_info
             }
+            self.result_cache.set(cache_key, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"FilterDetectionService: Ошибка: {e}")
+            return {
+                'status': 'error',
+                'error': str(e)
+            }
+
+    async def detect_and_rank(
+        self,
+        message_text: str,
+        candidates: List[Dict],
+        dialog_history: List[Dict] = None
+    ) -> Dict:
+        """
+        Определяет фильтры и ранжирует кандидатов за ОДИН вызов LLM
+
+        Объединяет detect_filters и rank_candidates_by_relevance: список
+        кандидатов добавляется в промпт определения фильтров, и LLM в том же
+        ответе возвращает recommended_id
+
+        Args:
+            message_text: Текущее сообщение пользователя
+            candidates: Список кандидатов с атрибутами (как в rank_candidates_by_relevance)
+            dialog_history: История диалога
+
+        Returns:
+            Dict: Результат как у detect_filters плюс
+                {
+                    'recommended_id': int | None,  # None если LLM вернул ID не из списка
+                    'ranking_confidence': float
+                }
+        """
+        try:
+            logger.info(f"FilterDetectionService: фильтры + ранжирование {len(candidates)} кандидатов для '{message_text[:50]}...'")
+
+            if not self.is_available or not self.ai_agent:
+                logger.warning("FilterDetectionService: недоступен (нет AIAgentService)")
+                return {
+                    'status': 'error',
+                    'error': 'Service unavailable'
+                }
+
+            cache_key = self._make_cache_key(message_text, dialog_history, candidates)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info("FilterDetectionService: фильтры и ранжирование взяты из кэша")
+                return cached
+
+            prompt = self._create_filter_detection_prompt(message_text, dialog_history or [], candidates)
+            logger.info(f"FilterDetectionService: отправляем объединенный промпт (длина: {len(prompt)} символов)")
+
+            response, usage_info = await self.ai_agent._call_yandex_gpt(prompt)
+
+            if not response:
+                logger.warning("FilterDetectionService: не получили ответ от LLM через AIAgentService")
+                return {
+                    'status': 'error',
+                    'error': 'No response from LLM'
+                }
+
+            parsed = self._parse_llm_response(response)
+
+            if not parsed:
+                logger.warning(f"FilterDetectionService: не удалось распарсить ответ: {response}")
+                return {
+                    'status': 'error',
+                    'error': 'Failed to parse LLM response'
+                }
+
+            filters = {
+                'incident_type': parsed.get('incident_type', ''),
+                'location_type': parsed.get('location_type', ''),
+                'category': parsed.get('category', ''),
+                'object_description': parsed.get('object_description', '')
+            }
+
+            # Невалидный ID не ломает фильтры - просто нет рекомендации
+            recommended_id = parsed.get('recommended_id')
+            valid_ids = [c.get('service_id') for c in candidates]
+            if recommended_id not in valid_ids:
+                logger.warning(f"FilterDetectionService: LLM вернул невалидный ID {recommended_id}, валидные: {valid_ids}")
+                recommended_id = None
+
+            ranking_confidence = parsed.get('ranking_confidence', 0.0)
+
+            logger.info(
+                f"FilterDetectionService: определены фильтры: "
+                f"incident_type={filters['incident_type']}, "
+                f"location_type={filters['location_type']}, "
+                f"category={filters['category']}, "
+                f"recommended_id={recommended_id} ({ranking_confidence})"
+            )
+
+            result = {
+                'status': 'success',
+                'filters': filters,
+                'confidence': parsed.get('confidence', 0.0),
+                'reason': parsed.get('reason', ''),
+                'recommended_id': recommended_id,
+                'ranking_confidence': ranking_confidence,
+                'usage_info': usage_info
+            }
+            self.result_cache.set(cache_key, result)
+            return result
 
         except Exception as e:
             logger.error(f"FilterDetectionService: Ошибка: {e}")
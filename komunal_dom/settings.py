@@ -155,6 +155,9 @@ LOGIN_URL = '/admin/login/'
 LOGOUT_URL = '/admin/logout/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 
+# Таймаут (сек) на вызовы LLM в воронке определения услуги (MainAgent)
+AI_TIMEOUT = config('AI_TIMEOUT', default=4.0, cast=float)
+
 # Настройки Jazzmin Admin
 JAZZMIN_SETTINGS = {
     # Заголовок админки
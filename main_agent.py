@@ -8,18 +8,215 @@
 
 import logging
 import asyncio
+import heapq
+import re
+import time
 import traceback
-from typing import Dict, List, Any, Tuple, Optional
+from itertools import chain
+from typing import Dict, List, Any, Tuple, Optional, Set
 from dataclasses import dataclass
+from django.conf import settings
 from django.db import connection
 from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
-
-@dataclass
+# Микросервисы импортируем один раз при загрузке модуля: каждый MainAgent() (а они
+# создаются на запрос) не повторяет импорт и обработку ImportError.
+# Недоступный сервис остается None и пропускается в _init_services
+try:
+    from tag_search_service import TagSearchService
+except ImportError:
+    TagSearchService = None
+
+try:
+    from semantic_search_service import SemanticSearchService
+except ImportError:
+    SemanticSearchService = None
+
+try:
+    from vector_search_service import VectorSearchService
+except ImportError:
+    VectorSearchService = None
+
+try:
+    from ai_agent_service import AIAgentService
+except ImportError:
+    AIAgentService = None
+
+try:
+    from filter_detection_service import FilterDetectionService
+except ImportError:
+    FilterDetectionService = None
+
+try:
+    from service_detection_modules import AddressExtractor
+except ImportError:
+    AddressExtractor = None
+
+# Шаблон SUCCESS-результата: копия уже нужного размера, без рехешей при заполнении
+_SUCCESS_RESULT_TEMPLATE = dict.fromkeys([
+    'status', 'service_id', 'service_name', 'confidence', 'source',
+    'message', 'candidates', 'needs_confirmation', 'is_followup'
+])
+_SUCCESS_RESULT_TEMPLATE['status'] = 'SUCCESS'
+_SUCCESS_RESULT_TEMPLATE['is_followup'] = False
+
+def _decode_sources(entry: Dict, source_names: List[str]) -> Dict:
+    """Заменяет битовую маску src_mask записи списком источников (в порядке сервисов)"""
+    mask = entry.pop('src_mask')
+    entry['sources'] = [name for bit, name in enumerate(source_names) if mask >> bit & 1]
+    return entry
+
+
+def _empty_extracted_filters() -> Dict:
+    """Пустой результат _extract_filters_from_message (фильтры не определены)"""
+    return {
+        'location': None,
+        'category': None,
+        'incident': None,
+        'object_description': None,
+        'ranking': None
+    }
+
+
+# Служебные поля кандидата, которые _load_candidates_attributes готовит для фильтрации.
+# Наружу (raw_result, метаданные MessageLog) они не отдаются
+_CANDIDATE_HELPER_KEYS = frozenset(('_incident_lc', '_category_lc', '_location_lc', '_display_name'))
+
+
+def _public_candidates(candidates: List[Dict]) -> List[Dict]:
+    """Копии кандидатов без служебных полей - для возврата из MainAgent"""
+    return [{k: v for k, v in c.items() if k not in _CANDIDATE_HELPER_KEYS} for c in candidates]
+
+
+def _sources_count(candidate: Dict) -> int:
+    """Ключ ранжирования кандидатов: число микросервисов, нашедших услугу"""
+    return len(candidate['sources'])
+
+
+# Битовые признаки атрибутов кандидатов для вопроса уточнения
+_LOC_INDIVIDUAL, _LOC_COMMON = 1, 2
+_INC_INCIDENT, _INC_REQUEST = 1, 2
+_CAT_WATER, _CAT_HEATING, _CAT_ELECTRIC, _CAT_CONSTRUCT, _CAT_LIFT = 1, 2, 4, 8, 16
+
+# Таблицы признаков: (бит, подстроки значения атрибута в нижнем регистре)
+_LOCATION_TAGS = (
+    (_LOC_INDIVIDUAL, ('индивид', 'квартир')),
+    (_LOC_COMMON, ('общедом', 'общее')),
+)
+_INCIDENT_TAGS = (
+    (_INC_INCIDENT, ('инцид',)),
+    (_INC_REQUEST, ('запрос', 'заявк')),
+)
+_CATEGORY_TAGS = (
+    (_CAT_WATER, ('вод', 'сантехник', 'канализ')),
+    (_CAT_HEATING, ('отопл',)),
+    (_CAT_ELECTRIC, ('электр',)),
+    (_CAT_CONSTRUCT, ('конструк',)),
+    (_CAT_LIFT, ('лифт',)),
+)
+
+
+def _classify_values(values: Set[str], tags: Tuple) -> int:
+    """Битовая маска признаков из таблицы tags, найденных в значениях values"""
+    mask = 0
+    for value in values:
+        value_lc = value.lower()
+        for bit, substrings in tags:
+            if any(sub in value_lc for sub in substrings):
+                mask |= bit
+    return mask
+
+
+def _collect_triple(candidates: List[Dict]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Уникальные location_type, category и incident_type кандидатов за один проход"""
+    location_types = set()
+    categories = set()
+    incident_types = set()
+    for c in candidates:
+        location_type = c.get('location_type')
+        if location_type:
+            location_types.add(location_type)
+        category = c.get('category')
+        if category:
+            categories.add(category)
+        incident_type = c.get('incident_type')
+        if incident_type:
+            incident_types.add(incident_type)
+    return location_types, categories, incident_types
+
+# Подстроки фоллбек-вопроса уточнения, собранные в одну альтернацию (один проход по тексту)
+_LEAK_WORDS_RE = re.compile('теч|протека|капа|утечк|льет')
+_BREAKAGE_WORDS_RE = re.compile('сломал|не работ|поломк')
+
+# Приветствия, которые не должны попадать в контекст followup (подстроки в нижнем регистре)
+_GREETING_KEYWORDS_RE = re.compile('привет|здравств|хай|hello|hi|добрый день|доброе утро|добрый вечер')
+
+# Ключевые слова запасного определения услуги (_fallback_service_detection).
+# Порядок категорий = приоритет проверки; каждая категория - одна скомпилированная альтернация
+_FALLBACK_KEYWORDS = (
+    ('water', ('теч', 'течет', 'протека', 'капа', 'утечк', 'льет', 'протек', 'затека', 'сырость', 'влага', 'капает', 'жидкость', 'сыро', 'мокро', 'протекает', 'течь')),
+    ('equipment', ('сломал', 'не работает', 'испортил', 'повредил', 'поломк', 'брак')),
+    ('heating', ('нет отопления', 'холодно', 'не греет', 'отопление не работает', 'батарея холодная')),
+    ('electricity', ('нет света', 'света нет', 'выключили свет', 'нет электричества', 'электричество')),
+    ('lift', ('лифт', 'лифта', 'лифтом', 'лифт не работает')),
+)
+_FALLBACK_PATTERNS = tuple(
+    (category, re.compile('|'.join(map(re.escape, keywords))))
+    for category, keywords in _FALLBACK_KEYWORDS
+)
+
+# Готовые ответы _fallback_service_detection по категориям; наружу отдается копия
+# (списки candidates/candidate_names тоже копируются, чтобы ответы запросов не делили их)
+_FALLBACK_RESULTS = {
+    'water': {
+        'status': 'AMBIGUOUS',
+        'candidates': [],
+        'candidate_names': [],
+        'message': 'Понял, у вас течь. Где именно это произошло? Пожалуйста, опишите подробнее.',
+        'needs_clarification': True,
+        'clarification_type': 'water'
+    },
+    'equipment': {
+        'status': 'AMBIGUOUS',
+        'candidates': [],
+        'candidate_names': [],
+        'message': 'Понимаю, у вас поломка оборудования. Что именно сломалось и где это произошло? Опишите подробнее.',
+        'needs_clarification': True,
+        'clarification_type': 'equipment'
+    },
+    'heating': {
+        'status': 'AMBIGUOUS',
+        'candidates': [],
+        'candidate_names': [],
+        'message': 'Похоже, проблема с отоплением. Где именно это произошло? Пожалуйста, уточните детали.',
+        'needs_clarification': True,
+        'clarification_type': 'heating'
+    },
+    'electricity': {
+        'status': 'AMBIGUOUS',
+        'candidates': [],
+        'candidate_names': [],
+        'message': 'Похоже, проблема с электричеством. Где именно это произошло? Опишите подробнее ситуацию.',
+        'needs_clarification': True,
+        'clarification_type': 'electricity'
+    },
+    'lift': {
+        'status': 'SUCCESS',
+        'service_id': 42,
+        'service_name': 'Лифт не работает, двери застряли, люди внутри',
+        'confidence': 0.9,
+        'source': 'fallback_detection',
+        'message': 'Я определил, что у вас проблема: Лифт не работает',
+        'candidates': []
+    },
+}
+
+
+@dataclass(slots=True, frozen=True)
 class ServiceCandidate:
-    """Кандидат услуги"""
+    """Кандидат услуги (slots - без __dict__ на экземпляр, frozen - хешируемый)"""
     service_id: int
     service_name: str
     confidence: float
@@ -55,6 +252,13 @@ class MainAgent:
         self.filter_detection = None  # ИСПРАВЛЕНО: Добавлен сервис определения фильтров
         self.address_extractor = None  # ДОБАВЛЕНО: Сервис извлечения адреса
         self.confidence_threshold = 0.75  # Порог уверенности
+        self.ai_timeout = getattr(settings, 'AI_TIMEOUT', 4.0)  # Таймаут (сек) на вызовы LLM, ограничивает хвост задержки
+
+        # Кэш атрибутов услуг из services_catalog: {service_id: attrs}
+        # Каталог почти статичен, поэтому повторные уточнения не ходят в БД
+        self.service_attrs_cache = {}
+        self.service_attrs_cache_ttl = 300  # Секунд до полного сброса кэша
+        self._service_attrs_cache_loaded_at = time.monotonic()
 
         # Инициализируем микросервисы
         self._init_services()
@@ -62,76 +266,72 @@ class MainAgent:
         logger.info("Главный Агент инициализирован с микросервисной архитектурой")
 
     def _init_services(self):
-        """Инициализация микросервисов"""
-        try:
-            from tag_search_service import TagSearchService
+        """Инициализация микросервисов (классы импортированы один раз при загрузке модуля)"""
+        if TagSearchService is not None:
             self.tag_search = TagSearchService()
             logger.info("TagSearchService инициализирован")
-        except ImportError:
+        else:
             logger.warning("TagSearchService не найден, будет пропущен")
 
-        try:
-            from semantic_search_service import SemanticSearchService
+        if SemanticSearchService is not None:
             self.semantic_search = SemanticSearchService()
             logger.info("SemanticSearchService инициализирован")
-        except ImportError:
+        else:
             logger.warning("SemanticSearchService не найден, будет пропущен")
 
-        try:
-            from vector_search_service import VectorSearchService
+        if VectorSearchService is not None:
             self.vector_search = VectorSearchService()
             logger.info("VectorSearchService инициализирован")
-        except ImportError:
+        else:
             logger.warning("VectorSearchService не найден, будет пропущен")
 
-        try:
-            from ai_agent_service import AIAgentService
+        if AIAgentService is not None:
             self.ai_agent = AIAgentService()
             logger.info("AIAgentService инициализирован")
-        except ImportError:
+        else:
             logger.warning("AIAgentService не найден, будет пропущен")
 
         # ИСПРАВЛЕНО: Добавлен FilterDetectionService (использует AIAgentService)
-        try:
-            from filter_detection_service import FilterDetectionService
+        if FilterDetectionService is not None:
             # Передаем ai_agent в FilterDetectionService чтобы не дублировать вызовы LLM
             self.filter_detection = FilterDetectionService(ai_agent_service=self.ai_agent)
             logger.info("FilterDetectionService инициализирован (через AIAgentService)")
-        except ImportError:
+        else:
             logger.warning("FilterDetectionService не найден, будет пропущен")
 
         # ДОБАВЛЕНО: AddressExtractor для извлечения адреса из сообщения
-        try:
-            from service_detection_modules import AddressExtractor
+        if AddressExtractor is not None:
             self.address_extractor = AddressExtractor()
             logger.info("AddressExtractor инициализирован в MainAgent")
-        except ImportError:
+        else:
             logger.warning("AddressExtractor не найден, извлечение адреса недоступно")
 
-    def _add_address_to_result(self, result: Dict, address_components: Dict) -> Dict:
+    def _build_address_patch(self, address_components: Dict) -> Dict:
         """
-        Добавляет адресные компоненты к результату
+        Готовит адресные поля для результата (один раз на запрос)
 
         Args:
-            result: Исходный результат
             address_components: Компоненты адреса из AddressExtractor
 
         Returns:
-            Dict: Результат с добавленными адресными компонентами
+            Dict: {'address_components', 'address_string'} или пустой dict,
+                  вливается в результат через result.update()
         """
-        if address_components and any(address_components.values()):
-            result['address_components'] = address_components
-            # Формируем строку адреса для удобства
-            parts = []
-            if address_components.get('street'):
-                parts.append(f"ул. {address_components['street']}")
-            if address_components.get('house_number'):
-                parts.append(f"д. {address_components['house_number']}")
-            if address_components.get('apartment_number'):
-                parts.append(f"кв. {address_components['apartment_number']}")
-            if parts:
-                result['address_string'] = ', '.join(parts)
-        return result
+        if not address_components or not any(address_components.values()):
+            return {}
+
+        address_patch = {'address_components': address_components}
+        # Формируем строку адреса для удобства
+        parts = []
+        if address_components.get('street'):
+            parts.append(f"ул. {address_components['street']}")
+        if address_components.get('house_number'):
+            parts.append(f"д. {address_components['house_number']}")
+        if address_components.get('apartment_number'):
+            parts.append(f"кв. {address_components['apartment_number']}")
+        if parts:
+            address_patch['address_string'] = ', '.join(parts)
+        return address_patch
 
     async def process_service_detection(self, message_text: str, user_context: Dict = None) -> Dict:
         """
@@ -166,29 +366,44 @@ class MainAgent:
         search_text = message_text
 
         if is_followup and dialog_history:
-            # Ищем предыдущее сообщение пользователя для объединения контекста
-            previous_user_messages = [msg for msg in dialog_history if msg.get('role') == 'user']
+            # Ищем предыдущие сообщения пользователя для объединения контекста.
+            # Один проход по истории: отбираем сообщения пользователя и сразу отсеиваем приветствия
+            # ИСПРАВЛЕНО (2025-12-25): Исключаем приветствия из контекста
+            previous_user_messages = []
+            last_user_message = None
+            greetings_count = 0
+            for msg in dialog_history:
+                if msg.get('role') != 'user':
+                    continue
+                last_user_message = msg
+                # Нижний регистр берем готовым из истории (text_lower от MessageHandlerService),
+                # иначе считаем один раз; проверяем альтернацией _GREETING_KEYWORDS_RE
+                text_lower = msg.get('text_lower')
+                if text_lower is None:
+                    text_lower = msg.get('text', '').lower()
+                if _GREETING_KEYWORDS_RE.search(text_lower):
+                    greetings_count += 1
+                else:
+                    previous_user_messages.append(msg)
 
             # ИСПРАВЛЕНО (2025-12-25): Исключаем текущее сообщение из истории если оно там есть
             # (потому что MessageHandlerService логирует ДО вызова MainAgent)
-            if previous_user_messages and previous_user_messages[-1].get('text', '') == message_text:
-                previous_user_messages = previous_user_messages[:-1]
+            if last_user_message is not None and last_user_message.get('text', '') == message_text:
+                if previous_user_messages and previous_user_messages[-1] is last_user_message:
+                    previous_user_messages.pop()
+                else:
+                    greetings_count -= 1
                 logger.info(f"Followup: исключено текущее сообщение из истории (уже в БД)")
 
-            # ИСПРАВЛЕНО (2025-12-25): Исключаем приветствия из контекста
-            GREETING_KEYWORDS = ['привет', 'здравств', 'хай', 'hello', 'hi', 'добрый день', 'доброе утро', 'добрый вечер']
-            non_greeting_messages = [
-                msg for msg in previous_user_messages
-                if not any(kw in msg.get('text', '').lower() for kw in GREETING_KEYWORDS)
-            ]
-            if len(non_greeting_messages) < len(previous_user_messages):
-                logger.info(f"Followup: исключены приветствия из истории: {len(previous_user_messages) - len(non_greeting_messages)} шт")
-            previous_user_messages = non_greeting_messages
+            if greetings_count:
+                logger.info(f"Followup: исключены приветствия из истории: {greetings_count} шт")
 
             if previous_user_messages:
                 # ИСПРАВЛЕНО (2025-12-25): Отладочный вывод
                 logger.info(f"Followup: всего user сообщений в истории: {len(previous_user_messages)}")
-                logger.info(f"Followup: последние 2 текста: {[m.get('text', '')[:30] for m in previous_user_messages[-2:]]}")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Followup: последние 2 текста: %s",
+                                [m.get('text', '')[:30] for m in previous_user_messages[-2:]])
 
                 # Берем последние 2 пользовательских сообщения для контекста
                 recent_user_texts = [msg.get('text', '') for msg in previous_user_messages[-2:]]
@@ -210,103 +425,114 @@ class MainAgent:
                     original_message,
                     context_memory=context_memory
                 )
-                logger.info(f"Извлечены адресные компоненты: {address_components}")
+                logger.info("Извлечены адресные компоненты: %s", address_components)
             except Exception as e:
                 logger.warning(f"Ошибка извлечения адреса: {e}")
+        address_patch = self._build_address_patch(address_components)
 
         try:
             # ===== ШАГ 1: Параллельно запускаем БЫСТРЫЕ микросервисы =====
+            # Задачи создаются сразу (create_task) и стартуют в порядке создания.
+            # TagSearch и SemanticSearch считают на CPU без await, поэтому VectorSearch
+            # (запрос к БД в потоке через sync_to_async) запускаем первым - ожидание БД
+            # перекрывается с их работой. Порядок результатов в gather прежний
+            vector_task = asyncio.create_task(self._run_vector_search(search_text)) if self.vector_search else None
             search_tasks = []
 
             if self.tag_search:
-                search_tasks.append(self._run_tag_search(search_text))
+                search_tasks.append(asyncio.create_task(self._run_tag_search(search_text)))
 
             if self.semantic_search:
-                search_tasks.append(self._run_semantic_search(search_text))
+                search_tasks.append(asyncio.create_task(self._run_semantic_search(search_text)))
 
-            if self.vector_search:
-                search_tasks.append(self._run_vector_search(search_text))
+            if vector_task:
+                search_tasks.append(vector_task)
 
             # Ждем результаты от быстрых микросервисов
+            # _run_* сами перехватывают исключения и возвращают {}, поэтому return_exceptions не нужен
             if search_tasks:
-                search_results = await asyncio.gather(*search_tasks, return_exceptions=True)
+                search_results = await asyncio.gather(*search_tasks)
             else:
                 return self._create_error_result("Нет доступных микросервисов")
 
             # ===== ШАГ 2: Анализируем результаты быстрых сервисов по ТЗ =====
             # Работаем с множествами service_id от каждого сервиса
             service_sets = []
-            service_results_map = {}  # {service_id: [sources]}
+            service_results_map = {}  # {service_id: данные услуги + src_mask}
+            # Источники копим битовой маской: бит N = source_names[N]; список sources
+            # собирается один раз для каждой услуги, которая идет дальше (_decode_sources)
+            source_names = []
+            # Методы словаря связываем с локальными именами один раз: цикл по кандидатам горячий
+            results_get = service_results_map.get
 
             for i, result in enumerate(search_results):
-                if isinstance(result, Exception):
-                    logger.error(f"Ошибка микросервиса: {result}")
-                    continue
-
                 if not result or not result.get('candidates'):
                     continue
 
-                # Создаем множество service_id от этого сервиса
-                service_ids = {c['service_id'] for c in result['candidates']}
-                service_sets.append(service_ids)
-
-                # Запоминаем источники для каждого service_id
-                source_name = result.get('method', f'service_{i}')
+                # Один проход: множество service_id этого сервиса + источники для каждого service_id
+                source_bit = 1 << len(source_names)
+                source_names.append(result.get('method', f'service_{i}'))
+                service_ids = set()
+                add_id = service_ids.add
                 for candidate in result['candidates']:
                     sid = candidate['service_id']
-                    if sid not in service_results_map:
-                        service_results_map[sid] = {
+                    add_id(sid)
+                    entry = results_get(sid)
+                    if entry is None:
+                        # Из исходных данных нужен только первый кандидат - храним его,
+                        # а не растущий список всех совпадений
+                        entry = service_results_map[sid] = {
                             'service_id': sid,
                             'service_name': candidate['service_name'],
-                            'sources': [],
-                            'all_data': []
+                            'src_mask': 0,
+                            'first_data': candidate
                         }
-                    service_results_map[sid]['sources'].append(source_name)
-                    service_results_map[sid]['all_data'].append(candidate)
+                    entry['src_mask'] |= source_bit
+                service_sets.append(service_ids)
 
-            logger.info(f"Получено {len(service_sets)} множеств от микросервисов")
-            for i, s in enumerate(service_sets):
-                logger.info(f"  Сервис {i}: {len(s)} услуг")
+            logger.info("Получено %d множеств от микросервисов, размеры: %s",
+                        len(service_sets), [len(s) for s in service_sets])
 
             # ===== ТЗ 3.2.1: Проверяем пересечение множеств =====
             if service_sets:
-                intersection = set.intersection(*service_sets)
-                logger.info(f"Пересечение всех множеств: {len(intersection)} услуг - {intersection}")
+                # Начинаем с наименьшего множества: промежуточный результат не больше него
+                intersection = set.intersection(*sorted(service_sets, key=len))
+                # Форматирование множества (repr) - только если запись реально попадет в лог
+                logger.info("Пересечение всех множеств: %d услуг - %s", len(intersection), intersection)
 
                 # Если есть однозначное пересечение (1 услуга)
                 if len(intersection) == 1:
                     service_id = list(intersection)[0]
-                    service_data = service_results_map[service_id]
-
-                    logger.info(f"ОДНОЗНАЧНОЕ ПЕРЕСЕЧЕНИЕ: service_id={service_id}, источники: {service_data['sources']}")
-
-                    result = {
-                        'status': 'SUCCESS',
-                        'service_id': service_id,
-                        'service_name': service_data['service_name'],
-                        'confidence': 1.0,  # Пересечение = 100%
-                        'source': '+'.join(service_data['sources']),
-                        'message': f'Правильно ли я понял, что у вас проблема: {service_data["service_name"]}?',
-                        'candidates': [service_data['all_data'][0]],
-                        'needs_confirmation': True,
-                        'is_followup': is_followup
-                    }
+                    service_data = _decode_sources(service_results_map[service_id], source_names)
+
+                    logger.info("ОДНОЗНАЧНОЕ ПЕРЕСЕЧЕНИЕ: service_id=%s, источники: %s", service_id, service_data['sources'])
+
+                    result = _SUCCESS_RESULT_TEMPLATE.copy()
+                    result.update(
+                        service_id=service_id,
+                        service_name=service_data['service_name'],
+                        confidence=1.0,  # Пересечение = 100%
+                        source='+'.join(service_data['sources']),
+                        message=f'Правильно ли я понял, что у вас проблема: {service_data["service_name"]}?',
+                        candidates=[service_data['first_data']],
+                        needs_confirmation=True,
+                        is_followup=is_followup
+                    )
                     # ДОБАВЛЕНО: Добавляем адресные компоненты
-                    return self._add_address_to_result(result, address_components)
+                    result.update(address_patch)
+                    return result
 
                 # Если пересечение из 2+ услуг - нужно уточнить
                 elif len(intersection) > 1:
                     logger.info(f"МНОЖЕСТВЕННОЕ ПЕРЕСЕЧЕНИЕ: {len(intersection)} услуг")
-                    candidates_data = [service_results_map[sid] for sid in intersection]
+                    candidates_data = [_decode_sources(service_results_map[sid], source_names) for sid in intersection]
                     return await self._create_ambiguous_result_from_intersection(candidates_data, original_message, is_followup, dialog_history)
 
             # ===== ТЗ 3.2.2: Нет пересечения или множества не пересекаются =====
             logger.info("НЕТ ОБЩЕГО ПЕРЕСЕЧЕНИЯ, формируем таблицу кандидатов")
 
             # Собираем всех кандидатов из всех сервисов (дедуплицированно)
-            all_service_ids = set()
-            for s in service_sets:
-                all_service_ids.update(s)
+            all_service_ids = set(chain.from_iterable(service_sets))
 
             logger.info(f"Всего уникальных кандидатов: {len(all_service_ids)}")
 
@@ -318,24 +544,28 @@ class MainAgent:
                     if ai_result and ai_result.get('candidates'):
                         ai_candidates = ai_result['candidates']
                         if len(ai_candidates) == 1:
-                            result = {
-                                'status': 'SUCCESS',
-                                'service_id': ai_candidates[0]['service_id'],
-                                'service_name': ai_candidates[0]['service_name'],
-                                'confidence': ai_candidates[0].get('confidence', 0.8),
-                                'source': 'ai_agent',
-                                'message': f'Правильно ли я понял, что у вас проблема: {ai_candidates[0]["service_name"]}?',
-                                'candidates': ai_candidates,
-                                'needs_confirmation': True
-                            }
-                            return self._add_address_to_result(result, address_components)
+                            result = _SUCCESS_RESULT_TEMPLATE.copy()
+                            result.update(
+                                service_id=ai_candidates[0]['service_id'],
+                                service_name=ai_candidates[0]['service_name'],
+                                confidence=ai_candidates[0].get('confidence', 0.8),
+                                source='ai_agent',
+                                message=f'Правильно ли я понял, что у вас проблема: {ai_candidates[0]["service_name"]}?',
+                                candidates=ai_candidates,
+                                needs_confirmation=True,
+                                is_followup=is_followup
+                            )
+                            result.update(address_patch)
+                            return result
 
                 # Fallback
-                return await self._fallback_service_detection(message_text, address_components)
+                return await self._fallback_service_detection(message_text, address_patch)
 
             # Есть кандидаты, но нет однозначного пересечения
-            candidates_data = [service_results_map[sid] for sid in all_service_ids]
+            candidates_data = [_decode_sources(service_results_map[sid], source_names) for sid in all_service_ids]
 
+            # Ответ FilterDetectionService передается дальше в уточнение, чтобы не вызывать LLM повторно
+            filter_result = None
             # ИСПРАВЛЕНО: FilterDetectionService запускается даже когда 0 кандидатов!
             # Логика: если традиционный поиск не сработал - используем LLM для определения фильтров
             if self.filter_detection:
@@ -348,12 +578,31 @@ class MainAgent:
                 if should_run:
                     logger.info(f"Запускаем FilterDetectionService (кандидатов: {len(candidates_data)})")
 
-                    # Вызываем FilterDetectionService
-                    filter_result = await self.filter_detection.detect_filters(original_message, dialog_history)
+                    # Атрибуты уже найденных кандидатов от ответа LLM не зависят - загружаем их
+                    # параллельно с вызовом FilterDetectionService
+                    attrs_task = asyncio.create_task(self._load_candidates_attributes(candidates_data)) if candidates_data else None
+
+                    # Вызываем FilterDetectionService. При 2+ кандидатах фильтры и ранжирование
+                    # топ-5 (те же, что уйдут в уточнение) получаем одним вызовом LLM
+                    if len(candidates_data) > 1:
+                        llm_call = self.filter_detection.detect_and_rank(
+                            original_message, heapq.nlargest(5, candidates_data, key=_sources_count), dialog_history
+                        )
+                    else:
+                        llm_call = self.filter_detection.detect_filters(original_message, dialog_history)
+                    try:
+                        filter_result = await asyncio.wait_for(llm_call, timeout=self.ai_timeout)
+                    except asyncio.TimeoutError:
+                        logger.warning(f"FilterDetectionService не ответил за {self.ai_timeout} с, продолжаем без фильтров")
+                        filter_result = {'status': 'error', 'error': 'ai_orchestrator_timeout'}
+
+                    if attrs_task is not None and filter_result.get('status') != 'success':
+                        # Без фильтров атрибуты здесь не понадобятся
+                        attrs_task.cancel()
 
                     if filter_result.get('status') == 'success':
                         filters = filter_result.get('filters', {})
-                        logger.info(f"FilterDetectionService вернул фильтры: {filters}")
+                        logger.info("FilterDetectionService вернул фильтры: %s", filters)
 
                         # ИСПРАВЛЕНО: Если 0 кандидатов - ищем ВСЕ услуги по фильтрам от LLM
                         if len(candidates_data) == 0:
@@ -361,42 +610,44 @@ class MainAgent:
                             candidates_with_attrs = await self._load_all_services_by_filters(filters)
                             logger.info(f"Найдено услуг по фильтрам LLM: {len(candidates_with_attrs)}")
                         else:
-                            # Загружаем атрибуты существующих кандидатов для фильтрации
-                            candidates_with_attrs = await self._load_candidates_attributes(candidates_data)
+                            # Атрибуты существующих кандидатов для фильтрации (загружались параллельно с LLM)
+                            candidates_with_attrs = await attrs_task
 
                         # Фильтруем кандидатов по полученным фильтрам
-                        filtered = candidates_with_attrs
-
+                        # Активные предикаты собираем один раз, затем один проход по кандидатам
+                        predicates = []
                         if filters.get('incident_type'):
-                            filtered = [c for c in filtered
-                                       if filters['incident_type'] in c.get('incident_type', '')]
-                            logger.info(f"Отфильтровано по incident_type={filters['incident_type']}: {len(filtered)} из {len(candidates_with_attrs)}")
-
+                            incident_value = filters['incident_type']
+                            predicates.append(lambda c: incident_value in c.get('incident_type', ''))
                         if filters.get('location_type'):
-                            filtered = [c for c in filtered
-                                       if filters['location_type'] in c.get('location_type', '')]
-                            logger.info(f"Отфильтровано по location_type={filters['location_type']}: {len(filtered)} из {len(candidates_with_attrs)}")
-
+                            location_value = filters['location_type']
+                            predicates.append(lambda c: location_value in c.get('location_type', ''))
                         if filters.get('category'):
-                            filtered = [c for c in filtered
-                                       if filters['category'].lower() in c.get('category', '').lower()]
-                            logger.info(f"Отфильтровано по category={filters['category']}: {len(filtered)} из {len(candidates_with_attrs)}")
+                            category_value = filters['category'].lower()
+                            predicates.append(lambda c: category_value in c.get('_category_lc', ''))
+
+                        if predicates:
+                            filtered = [c for c in candidates_with_attrs if all(p(c) for p in predicates)]
+                            logger.info(f"Отфильтровано по фильтрам LLM: {len(filtered)} из {len(candidates_with_attrs)}")
+                        else:
+                            filtered = candidates_with_attrs
 
                         # Если после фильтрации остался 1 кандидат - SUCCESS
                         if len(filtered) == 1:
                             candidate = filtered[0]
-                            result = {
-                                'status': 'SUCCESS',
-                                'service_id': candidate['service_id'],
-                                'service_name': candidate.get('service_name', candidate.get('scenario_name', 'Unknown')),
-                                'confidence': filter_result.get('confidence', 0.8),
-                                'source': 'filter_detection',
-                                'message': f"Понял, у вас: {candidate.get('service_name', candidate.get('scenario_name'))}. Это правильно?",
-                                'candidates': [candidate],
-                                'needs_confirmation': True,
-                                'is_followup': is_followup
-                            }
-                            return self._add_address_to_result(result, address_components)
+                            result = _SUCCESS_RESULT_TEMPLATE.copy()
+                            result.update(
+                                service_id=candidate['service_id'],
+                                service_name=candidate['_display_name'],
+                                confidence=filter_result.get('confidence', 0.8),
+                                source='filter_detection',
+                                message=f"Понял, у вас: {candidate['_display_name']}. Это правильно?",
+                                candidates=_public_candidates([candidate]),
+                                needs_confirmation=True,
+                                is_followup=is_followup
+                            )
+                            result.update(address_patch)
+                            return result
 
                         # Если кандидаты отфильтровались до 0 - используем оригинальный список
                         if not filtered:
@@ -406,7 +657,9 @@ class MainAgent:
                         # Передаем отфильтрованных кандидатов в AMBIGUOUS
                         candidates_data = filtered
 
-            return await self._create_ambiguous_result_from_candidates(candidates_data, original_message, is_followup, dialog_history)
+            return await self._create_ambiguous_result_from_candidates(
+                candidates_data, original_message, is_followup, dialog_history, filter_result=filter_result
+            )
 
         except Exception as e:
             # Детальное логирование критических ошибок
@@ -425,57 +678,6 @@ class MainAgent:
                 'candidates': []
             }
 
-    def _should_run_ai_agent(self, service_results: List[Dict], search_text: str, candidates: List[Dict]) -> Optional[str]:
-        """
-        Анализ необходимости запуска AI агента
-
-        AI запускается ТОЛЬКО если:
-        1. Нет результатов от быстрых сервисов
-        2. Сильное расхождение между сервисами
-        3. Низкая уверенность у всех кандидатов
-
-        Args:
-            service_results: Результаты от быстрых сервисов
-            search_text: Исходный текст поиска
-            candidates: Все найденные кандидаты
-
-        Returns:
-            Optional[str]: Причина запуска AI или None
-        """
-        # Причина 1: Нет результатов от быстрых сервисов
-        if not service_results or not candidates:
-            return "no_results_from_fast_services"
-
-        # Причина 2: Низкая уверенность у лучшего кандидата
-        if candidates:
-            best_confidence = max(c.get('confidence', 0) for c in candidates)
-            if best_confidence < 0.40:
-                return f"low_confidence_{best_confidence:.2f}"
-
-        # Причина 3: Сильное расхождение между сервисами
-        if len(service_results) >= 2:
-            # Анализируем пересечения результатов
-            service_sets = []
-            for result in service_results:
-                service_ids = {candidate['service_id'] for candidate in result.get('candidates', [])}
-                service_sets.append(service_ids)
-
-            # Если 2+ сервиса не имеют пересечений
-            if len(service_sets) >= 2:
-                intersection = set.intersection(*service_sets)
-                union = set.union(*service_sets)
-
-                # Нет пересечений и много разных кандидатов
-                if len(intersection) == 0 and len(union) >= 3:
-                    return f"no_intersection_{len(union)}_candidates"
-
-                # Только 2 кандидата без пересечения
-                if len(intersection) == 0 and len(union) == 2:
-                    return "no_intersection_two_candidates"
-
-        # AI не нужен
-        return None
-
     async def _run_tag_search(self, message_text: str) -> Dict:
         """Запуск TagSearchService"""
         try:
@@ -511,11 +713,11 @@ class MainAgent:
 
         logger.info(f"Множественное пересечение: {sources_info}")
 
-        # ИСПРАВЛЕНО: Загружаем атрибуты из БД вместо пустых значений
-        candidates_with_attrs = await self._load_candidates_attributes(candidates_data)
+        # ИСПРАВЛЕНО: Загружаем атрибуты из БД вместо пустых значений (параллельно с LLM-фильтрами)
+        candidates_with_attrs, extracted_filters = await self._load_attributes_and_filters(candidates_data, original_message, dialog_history)
 
         # Генерируем умный уточняющий вопрос с учетом истории
-        clarification_result = self._generate_smart_clarification(candidates_with_attrs, original_message, is_followup, dialog_history)
+        clarification_result = await self._generate_smart_clarification(candidates_with_attrs, original_message, is_followup, dialog_history, extracted_filters)
 
         # ИСПРАВЛЕНО: Если после фильтрации остался 1 кандидат - возвращаем SUCCESS
         if clarification_result.get('status') == 'SUCCESS' and clarification_result.get('single_candidate'):
@@ -523,7 +725,7 @@ class MainAgent:
             return {
                 'status': 'SUCCESS',
                 'service_id': candidate['service_id'],
-                'service_name': candidate.get('service_name', candidate.get('scenario_name', 'Unknown')),
+                'service_name': candidate['_display_name'],
                 'confidence': 1.0,
                 'source': 'filtered_search',
                 'message': clarification_result['message'],
@@ -537,8 +739,8 @@ class MainAgent:
 
         return {
             'status': 'AMBIGUOUS',
-            'candidates': filtered_candidates,  # ИСПРАВЛЕНО: отфильтрованные кандидаты
-            'candidate_names': [c.get('service_name', c.get('scenario_name', 'Unknown')) for c in filtered_candidates],
+            'candidates': _public_candidates(filtered_candidates),  # ИСПРАВЛЕНО: отфильтрованные кандидаты
+            'candidate_names': [c['_display_name'] for c in filtered_candidates],
             'message': clarification_result['message'],
             'needs_clarification': True,
             'clarification_type': 'intersection_multiple',
@@ -596,24 +798,27 @@ class MainAgent:
         # AI не нужен
         return None
 
-    async def _create_ambiguous_result_from_candidates(self, candidates_data: List[Dict], original_message: str = "", is_followup: bool = False, dialog_history: List[Dict] = None) -> Dict:
+    async def _create_ambiguous_result_from_candidates(self, candidates_data: List[Dict], original_message: str = "", is_followup: bool = False, dialog_history: List[Dict] = None, filter_result: Optional[Dict] = None) -> Dict:
         """
         Создание результата из таблицы кандидатов по ТЗ 3.2.2
 
         ИСПРАВЛЕНО: Сделано async для загрузки атрибутов из БД
+        ДОБАВЛЕНО: filter_result - ответ FilterDetectionService, уже полученный в process_service_detection
+        (в том числе ошибка или таймаут); LLM повторно не вызывается
         """
-        # Сортируем по количеству источников (чем больше, тем выше приоритет)
-        candidates_data.sort(key=lambda x: len(x['sources']), reverse=True)
-
-        candidate_names = [c['service_name'] for c in candidates_data[:5]]
+        # Берем топ-5 по количеству источников (чем больше, тем выше приоритет)
+        # nlargest - O(N log 5) без полной сортировки и без перестановки candidates_data
+        top_candidates = heapq.nlargest(5, candidates_data, key=_sources_count)
 
         logger.info(f"Формируем запрос уточнения из {len(candidates_data)} кандидатов")
 
-        # ИСПРАВЛЕНО: Загружаем атрибуты из БД вместо пустых значений
-        candidates_with_attrs = await self._load_candidates_attributes(candidates_data[:5])
+        # ИСПРАВЛЕНО: Загружаем атрибуты из БД вместо пустых значений (параллельно с LLM-фильтрами)
+        candidates_with_attrs, extracted_filters = await self._load_attributes_and_filters(
+            top_candidates, original_message, dialog_history, filter_result=filter_result
+        )
 
         # Генерируем умный уточняющий вопрос с учетом истории
-        clarification_result = self._generate_smart_clarification(candidates_with_attrs, original_message, is_followup, dialog_history)
+        clarification_result = await self._generate_smart_clarification(candidates_with_attrs, original_message, is_followup, dialog_history, extracted_filters)
 
         # ИСПРАВЛЕНО: Если после фильтрации остался 1 кандидат - возвращаем SUCCESS
         if clarification_result.get('status') == 'SUCCESS' and clarification_result.get('single_candidate'):
@@ -621,11 +826,11 @@ class MainAgent:
             return {
                 'status': 'SUCCESS',
                 'service_id': candidate['service_id'],
-                'service_name': candidate.get('service_name', candidate.get('scenario_name', 'Unknown')),
+                'service_name': candidate['_display_name'],
                 'confidence': 1.0,
                 'source': 'filtered_search',
                 'message': clarification_result['message'],
-                'candidates': candidates_data[:1],
+                'candidates': top_candidates[:1],
                 'needs_confirmation': False,
                 'is_followup': is_followup
             }
@@ -635,8 +840,8 @@ class MainAgent:
 
         return {
             'status': 'AMBIGUOUS',
-            'candidates': filtered_candidates,  # ИСПРАВЛЕНО: отфильтрованные кандидаты
-            'candidate_names': [c.get('service_name', c.get('scenario_name', 'Unknown')) for c in filtered_candidates],
+            'candidates': _public_candidates(filtered_candidates),  # ИСПРАВЛЕНО: отфильтрованные кандидаты
+            'candidate_names': [c['_display_name'] for c in filtered_candidates],
             'message': clarification_result['message'],
             'needs_clarification': True,
             'clarification_type': 'no_intersection',
@@ -649,21 +854,28 @@ class MainAgent:
         для умного анализа различий между кандидатами
 
         ИСПРАВЛЕНО: Сделано async для корректной работы в async контексте
+        ДОБАВЛЕНО: Атрибуты кэшируются в self.service_attrs_cache, из БД грузятся только отсутствующие
         """
         if not candidates_data:
             return []
 
         try:
-            def load_sync():
-                service_ids = [c['service_id'] for c in candidates_data]
+            # Сбрасываем кэш по TTL, чтобы подхватить изменения каталога
+            if time.monotonic() - self._service_attrs_cache_loaded_at > self.service_attrs_cache_ttl:
+                self.service_attrs_cache = {}
+                self._service_attrs_cache_loaded_at = time.monotonic()
+
+            missing_ids = list({c['service_id'] for c in candidates_data} - self.service_attrs_cache.keys())
 
+            def load_sync():
                 with connection.cursor() as cursor:
                     # Используем денормализованные колонки
+                    # ANY(массив) - один текст запроса при любом числе ID (план переиспользуется)
                     cursor.execute("""
                         SELECT service_id, scenario_name, incident_type, category, location_type
                         FROM services_catalog
-                        WHERE service_id IN %s
-                    """, [tuple(service_ids)])
+                        WHERE service_id = ANY(%s)
+                    """, [missing_ids])
 
                     attrs_map = {}
                     for row in cursor.fetchall():
@@ -677,18 +889,34 @@ class MainAgent:
 
                 return attrs_map
 
-            attrs_map = await sync_to_async(load_sync)()
+            if missing_ids:
+                loaded = await sync_to_async(load_sync)()
+                # Отсутствующие в каталоге ID тоже запоминаем, чтобы не запрашивать повторно
+                for service_id in missing_ids:
+                    self.service_attrs_cache[service_id] = loaded.get(service_id, {})
+                logger.info(f"Атрибуты из БД: {len(missing_ids)}, из кэша: {len(candidates_data) - len(missing_ids)}")
+
+            attrs_map = self.service_attrs_cache
 
             # Обогащаем данные кандидатов атрибутами
             enriched = []
             for candidate in candidates_data:
                 service_id = candidate['service_id']
                 attrs = attrs_map.get(service_id, {})
+                incident_type = attrs.get('incident_type', '')
+                category = attrs.get('category', '')
+                location_type = attrs.get('location_type', '')
                 enriched.append({
                     **candidate,
-                    'incident_type': attrs.get('incident_type', ''),
-                    'category': attrs.get('category', ''),
-                    'location_type': attrs.get('location_type', '')
+                    'incident_type': incident_type,
+                    'category': category,
+                    'location_type': location_type,
+                    # Нижний регистр считаем один раз здесь, а не в каждом фильтре уточнения
+                    '_incident_lc': incident_type.lower(),
+                    '_category_lc': category.lower(),
+                    '_location_lc': location_type.lower(),
+                    # Отображаемое имя нормализуем здесь, чтобы не повторять цепочку .get при каждом ответе
+                    '_display_name': candidate.get('service_name') or attrs.get('scenario_name') or 'Unknown'
                 })
 
             logger.info(f"Загружены атрибуты для {len(enriched)} кандидатов")
@@ -696,9 +924,12 @@ class MainAgent:
 
         except Exception as e:
             logger.error(f"Ошибка загрузки атрибутов кандидатов: {e}")
-            return candidates_data
+            return [
+                {**c, '_display_name': c.get('service_name') or c.get('scenario_name') or 'Unknown'}
+                for c in candidates_data
+            ]
 
-    async def _load_all_services_by_filters(self, filters: Dict) -> List[Dict]:
+    async def _load_all_services_by_filters(self, filters: Dict, limit: int = 50) -> List[Dict]:
         """
         Ищет ВСЕ услуги в БД по фильтрам от FilterDetectionService
 
@@ -712,46 +943,52 @@ class MainAgent:
                     'location_type': 'Индивидуальное' or 'Общедомовое',
                     'category': 'Водоснабжение' or ...
                 }
+            limit: Максимум строк (пользователю показываются только первые кандидаты)
 
         Returns:
             List[Dict]: Список кандидатов с атрибутами
         """
         try:
             def load_sync():
-                with connection.cursor() as cursor:
-                    # Строим SQL запрос с фильтрами
-                    sql = "SELECT service_id, scenario_name, incident_type, category, location_type FROM services_catalog WHERE is_active = TRUE"
-                    params = []
-
-                    # Добавляем фильтры если они есть
-                    if filters.get('incident_type'):
-                        sql += " AND incident_type = %s"
-                        params.append(filters['incident_type'])
+                incident_type = filters.get('incident_type') or None
+                location_type = filters.get('location_type') or None
+                # Частичное совпадение для категории
+                category_pattern = f"%{filters['category']}%" if filters.get('category') else None
 
-                    if filters.get('location_type'):
-                        sql += " AND location_type = %s"
-                        params.append(filters['location_type'])
-
-                    if filters.get('category'):
-                        # Частичное совпадение для категории
-                        sql += " AND category ILIKE %s"
-                        params.append(f"%{filters['category']}%")
-
-                    sql += " ORDER BY scenario_name"
-                    logger.info(f"SQL для поиска по фильтрам: {sql} с параметрами {params}")
-
-                    cursor.execute(sql, params)
+                with connection.cursor() as cursor:
+                    # Постоянный текст запроса: неактивный фильтр = NULL, план переиспользуется
+                    cursor.execute("""
+                        SELECT service_id, scenario_name, incident_type, category, location_type
+                        FROM services_catalog
+                        WHERE is_active = TRUE
+                          AND (%s::text IS NULL OR incident_type = %s)
+                          AND (%s::text IS NULL OR location_type = %s)
+                          AND (%s::text IS NULL OR category ILIKE %s)
+                        ORDER BY scenario_name
+                        LIMIT %s
+                    """, [incident_type, incident_type,
+                          location_type, location_type,
+                          category_pattern, category_pattern,
+                          limit])
                     results = cursor.fetchall()
 
                 # Конвертируем в формат кандидатов
+                # Поля _*_lc готовим здесь же, как в _load_candidates_attributes
                 candidates = []
                 for row in results:
+                    incident_type = row[2] or ''
+                    category = row[3] or ''
+                    location_type = row[4] or ''
                     candidates.append({
                         'service_id': row[0],
                         'service_name': row[1],
-                        'incident_type': row[2] or '',
-                        'category': row[3] or '',
-                        'location_type': row[4] or '',
+                        '_display_name': row[1] or 'Unknown',
+                        'incident_type': incident_type,
+                        'category': category,
+                        'location_type': location_type,
+                        '_incident_lc': incident_type.lower(),
+                        '_category_lc': category.lower(),
+                        '_location_lc': location_type.lower(),
                         'confidence': 0.7,  # Базовая уверенность для найденных по фильтрам
                         'sources': ['filter_detection'],
                         'source': 'filter_detection'
@@ -767,61 +1004,42 @@ class MainAgent:
             logger.error(f"Ошибка поиска услуг по фильтрам: {e}")
             return []
 
-    def _extract_filters_from_message(self, message_text: str, dialog_history: List[Dict] = None) -> Dict:
+    async def _extract_filters_from_message(self, message_text: str, dialog_history: List[Dict] = None, candidates: List[Dict] = None) -> Dict:
         """
         Извлекает фильтры (location, category, incident, object_description) из текста сообщения и истории диалога
 
         ИСПРАВЛЕНО (2025-12-25): Добавлен вызов FilterDetectionService для object_description
+        ДОБАВЛЕНО: Если передано 2+ кандидатов - фильтры и ранжирование за один вызов LLM (detect_and_rank)
 
         Args:
             message_text: Текст сообщения пользователя
             dialog_history: История диалога
+            candidates: Кандидаты для ранжирования (опционально)
 
         Returns:
             Dict: {
                 'location': 'Индивидуальное' | 'Общедомовое' | None,
                 'category': 'Водоснабжение' | ... | None,
                 'incident': 'Инцидент' | 'Запрос' | None,
-                'object_description': 'описание объекта' | None
+                'object_description': 'описание объекта' | None,
+                'ranking': {'recommended_id': int, 'confidence': float} | None
             }
         """
-        filters = {
-            'location': None,
-            'category': None,
-            'incident': None,
-            'object_description': None  # ИСПРАВЛЕНО (2025-12-25)
-        }
+        filters = _empty_extracted_filters()
 
         # ИСПРАВЛЕНО (2025-12-25): Сначала пробуем FilterDetectionService для object_description
         if self.filter_detection:
             try:
-                # ИСПРАВЛЕНО: Используем await вместо asyncio.run()
-                # Но это не async функция, поэтому сохраняем как есть и вызываем через sync wrapper
-                def call_filter_sync():
-                    import asyncio
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        # Если уже в event loop - создаем задачу
-                        import concurrent.futures
-                        with concurrent.futures.ThreadPoolExecutor() as pool:
-                            future = pool.submit(asyncio.run, self.filter_detection.detect_filters(message_text, dialog_history or []))
-                            return future.result()
-                    else:
-                        return asyncio.run(self.filter_detection.detect_filters(message_text, dialog_history or []))
-
-                filter_result = call_filter_sync()
-                if filter_result.get('status') == 'success':
-                    filter_svc_filters = filter_result.get('filters', {})
-                    # Если FilterDetectionService вернул значения - используем их
-                    if filter_svc_filters.get('location_type'):
-                        filters['location'] = filter_svc_filters['location_type']
-                    if filter_svc_filters.get('category'):
-                        filters['category'] = filter_svc_filters['category']
-                    if filter_svc_filters.get('incident_type'):
-                        filters['incident'] = filter_svc_filters['incident_type']
-                    if filter_svc_filters.get('object_description'):
-                        filters['object_description'] = filter_svc_filters['object_description']
-                        logger.info(f"FilterDetectionService извлек object_description: {filters['object_description']}")
+                # ИСПРАВЛЕНО: await напрямую, без ThreadPoolExecutor + asyncio.run на каждый вызов
+                # Ограничиваем тем же ai_timeout, что и основной вызов FilterDetectionService
+                if candidates and len(candidates) > 1:
+                    llm_call = self.filter_detection.detect_and_rank(message_text, candidates, dialog_history or [])
+                else:
+                    llm_call = self.filter_detection.detect_filters(message_text, dialog_history or [])
+                filter_result = await asyncio.wait_for(llm_call, timeout=self.ai_timeout)
+                filters = self._filters_from_detection_result(filter_result)
+            except asyncio.TimeoutError:
+                logger.warning(f"FilterDetectionService не ответил за {self.ai_timeout} с, уточняем без фильтров")
             except Exception as e:
                 logger.warning(f"Ошибка вызова FilterDetectionService: {e}")
 
@@ -831,7 +1049,57 @@ class MainAgent:
 
         return filters
 
-    def _generate_smart_clarification(self, candidates_with_attrs: List[Dict], original_message: str = "", is_followup: bool = False, dialog_history: List[Dict] = None) -> Dict:
+    def _filters_from_detection_result(self, filter_result: Dict) -> Dict:
+        """Переводит ответ FilterDetectionService в формат _extract_filters_from_message"""
+        filters = _empty_extracted_filters()
+        if filter_result.get('status') != 'success':
+            return filters
+
+        if filter_result.get('recommended_id') is not None:
+            filters['ranking'] = {
+                'recommended_id': filter_result['recommended_id'],
+                'confidence': filter_result.get('ranking_confidence', 0.0)
+            }
+        filter_svc_filters = filter_result.get('filters', {})
+        # Если FilterDetectionService вернул значения - используем их
+        if filter_svc_filters.get('location_type'):
+            filters['location'] = filter_svc_filters['location_type']
+        if filter_svc_filters.get('category'):
+            filters['category'] = filter_svc_filters['category']
+        if filter_svc_filters.get('incident_type'):
+            filters['incident'] = filter_svc_filters['incident_type']
+        if filter_svc_filters.get('object_description'):
+            filters['object_description'] = filter_svc_filters['object_description']
+            logger.info(f"FilterDetectionService извлек object_description: {filters['object_description']}")
+        return filters
+
+    async def _load_attributes_and_filters(self, candidates_data: List[Dict], original_message: str, dialog_history: List[Dict] = None, filter_result: Optional[Dict] = None) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Параллельно загружает атрибуты кандидатов из БД и фильтры от LLM
+
+        Зависимости по данным нет: LLM нужны только сообщение и названия кандидатов,
+        БД - только service_id. Итоговая задержка = max(БД, LLM), а не сумма.
+
+        Args:
+            filter_result: Уже полученный ответ FilterDetectionService - LLM повторно не вызывается
+
+        Returns:
+            Tuple[List[Dict], Optional[Dict]]: (кандидаты с атрибутами, результат _extract_filters_from_message)
+        """
+        if not candidates_data:
+            return [], None
+
+        if filter_result is not None:
+            # Всегда dict (при ошибке/таймауте - пустые фильтры): иначе _generate_smart_clarification запросит фильтры сам
+            return await self._load_candidates_attributes(candidates_data), self._filters_from_detection_result(filter_result)
+
+        candidates_with_attrs, extracted_filters = await asyncio.gather(
+            self._load_candidates_attributes(candidates_data),
+            self._extract_filters_from_message(original_message, dialog_history, candidates_data)
+        )
+        return candidates_with_attrs, extracted_filters
+
+    async def _generate_smart_clarification(self, candidates_with_attrs: List[Dict], original_message: str = "", is_followup: bool = False, dialog_history: List[Dict] = None, extracted_filters: Dict = None) -> Dict:
         """
         Генерирует умный уточняющий вопрос на основе анализа атрибутов кандидатов
 
@@ -851,7 +1119,9 @@ class MainAgent:
             }
 
         # ИЗВЛЕКАЕМ ФИЛЬТРЫ ИЗ СООБЩЕНИЯ ПОЛЬЗОВАТЕЛЯ И ИСТОРИИ ДИАЛОГА
-        extracted_filters = self._extract_filters_from_message(original_message, dialog_history)
+        # (если не получены заранее параллельно с загрузкой атрибутов)
+        if extracted_filters is None:
+            extracted_filters = await self._extract_filters_from_message(original_message, dialog_history, candidates_with_attrs)
         known_location = extracted_filters['location']
         known_category = extracted_filters['category']
         known_incident = extracted_filters['incident']
@@ -860,85 +1130,69 @@ class MainAgent:
         logger.info(f"Извлеченные фильтры: location={known_location}, category={known_category}, incident={known_incident}, object={known_object}")
 
         # Фильтруем кандидатов на основе известной информации
-        filtered_candidates = candidates_with_attrs
-        if known_location:
-            filtered_candidates = [c for c in filtered_candidates if known_location in c.get('location_type', '')]
-            logger.info(f"Отфильтровано по location_type={known_location}: {len(filtered_candidates)} из {len(candidates_with_attrs)}")
-
-        if known_category:
-            # Прямое совпадение категории (FilterDetectionService уже возвращает корректную категорию)
-            filtered_candidates = [c for c in filtered_candidates if known_category.lower() in c.get('category', '').lower()]
-            logger.info(f"Отфильтровано по category={known_category}: {len(filtered_candidates)} из {len(candidates_with_attrs)}")
-
-        if known_incident:
-            # Фильтрация по типу инцидента
-            filtered_candidates = [c for c in filtered_candidates if known_incident in c.get('incident_type', '')]
-            logger.info(f"Отфильтровано по incident_type={known_incident}: {len(filtered_candidates)} из {len(candidates_with_attrs)}")
+        # Сравниваем с полями _*_lc, подготовленными в _load_candidates_attributes.
+        # Все известные фильтры проверяются за один проход: пустая строка входит в любую,
+        # поэтому неизвестное измерение пропускает всех кандидатов.
+        # В том же проходе собираем уникальные значения измерений для анализа ниже
+        known_location_lc = (known_location or '').lower()
+        # Прямое совпадение категории (FilterDetectionService уже возвращает корректную категорию)
+        known_category_lc = (known_category or '').lower()
+        known_incident_lc = (known_incident or '').lower()
+        filtered_candidates = []
+        location_types = set()
+        categories = set()
+        incident_types = set()
+        for c in candidates_with_attrs:
+            if (known_location_lc in c.get('_location_lc', '')
+                    and known_category_lc in c.get('_category_lc', '')
+                    and known_incident_lc in c.get('_incident_lc', '')):
+                filtered_candidates.append(c)
+                if c.get('location_type'):
+                    location_types.add(c['location_type'])
+                if c.get('category'):
+                    categories.add(c['category'])
+                if c.get('incident_type'):
+                    incident_types.add(c['incident_type'])
+
+        if known_location or known_category or known_incident:
+            logger.info(
+                f"Отфильтровано по location_type={known_location}, category={known_category}, "
+                f"incident_type={known_incident}: {len(filtered_candidates)} из {len(candidates_with_attrs)}"
+            )
 
         # ИСПРАВЛЕНО (2025-12-25): Ранжирование через LLM вместо хардкода keywords
         if known_object and len(filtered_candidates) > 1:
             logger.info(f"Ранжирование {len(filtered_candidates)} кандидатов по object_description='{known_object}' через LLM")
 
-            if self.filter_detection:
-                try:
-                    # Используем ThreadPoolExecutor для вызова async из sync контекста
-                    def call_ranking_sync():
-                        loop = asyncio.get_event_loop()
-                        if loop.is_running():
-                            import concurrent.futures
-                            with concurrent.futures.ThreadPoolExecutor() as pool:
-                                future = pool.submit(
-                                    asyncio.run,
-                                    self.filter_detection.rank_candidates_by_relevance(
-                                        message_text=original_message,
-                                        candidates=filtered_candidates,
-                                        dialog_history=dialog_history
-                                    )
-                                )
-                                return future.result()
-                        return asyncio.run(
-                            self.filter_detection.rank_candidates_by_relevance(
-                                message_text=original_message,
-                                candidates=filtered_candidates,
-                                dialog_history=dialog_history
-                            )
-                        )
-
-                    ranking_result = call_ranking_sync()
-
-                    if ranking_result.get('status') == 'success':
-                        recommended_id = ranking_result.get('recommended_id')
-                        confidence = ranking_result.get('confidence', 0.0)
-                        reason = ranking_result.get('reason', '')
-
-                        # Находим рекомендованного кандидата
-                        recommended_candidate = None
-                        for c in filtered_candidates:
-                            if c.get('service_id') == recommended_id:
-                                recommended_candidate = c
-                                break
-
-                        if recommended_candidate:
-                            logger.info(
-                                f"LLM рекомендовал: {recommended_candidate['service_name']} "
-                                f"(ID: {recommended_id}, confidence: {confidence})"
-                            )
-
-                            # Если confidence > 0.7, выбираем этого кандидата
-                            if confidence >= 0.7:
-                                logger.info(f"По LLM ранжированию выбран кандидат: {recommended_candidate['service_name']}")
-                                filtered_candidates = [recommended_candidate]
-                            else:
-                                logger.info(f"LLM confidence слишком низкий ({confidence}), оставляем всех кандидатов")
-                        else:
-                            logger.warning(f"LLM вернул невалидный recommended_id={recommended_id}")
+            # Ранжирование уже получено в том же вызове LLM, что и фильтры (detect_and_rank)
+            ranking = extracted_filters.get('ranking')
+            if ranking:
+                recommended_id = ranking['recommended_id']
+                confidence = ranking['confidence']
+
+                # Находим рекомендованного кандидата среди оставшихся после фильтрации
+                recommended_candidate = None
+                for c in filtered_candidates:
+                    if c.get('service_id') == recommended_id:
+                        recommended_candidate = c
+                        break
+
+                if recommended_candidate:
+                    logger.info(
+                        f"LLM рекомендовал: {recommended_candidate['service_name']} "
+                        f"(ID: {recommended_id}, confidence: {confidence})"
+                    )
+
+                    # Если confidence > 0.7, выбираем этого кандидата
+                    if confidence >= 0.7:
+                        logger.info(f"По LLM ранжированию выбран кандидат: {recommended_candidate['service_name']}")
+                        filtered_candidates = [recommended_candidate]
                     else:
-                        logger.warning(f"LLM ранжирование не удалось: {ranking_result.get('error')}")
-
-                except Exception as e:
-                    logger.error(f"Ошибка вызова LLM ранжирования: {e}")
+                        logger.info(f"LLM confidence слишком низкий ({confidence}), оставляем всех кандидатов")
+                else:
+                    logger.warning(f"LLM рекомендовал service_id={recommended_id}, которого нет среди отфильтрованных")
             else:
-                logger.warning("FilterDetectionService недоступен, пропускаем ранжирование")
+                logger.warning("Ранжирование от LLM недоступно, пропускаем")
 
         # Если после фильтрации остался 1 кандидат - возвращаем SUCCESS
         if len(filtered_candidates) == 1:
@@ -952,52 +1206,43 @@ class MainAgent:
                 'filtered_candidates': filtered_candidates
             }
 
-        # ИСПРАВЛЕНО: Если осталось несколько кандидатов с одинаковыми атрибутами - пробуем уточнить по keywords
-        if len(filtered_candidates) > 1:
-            # Проверяем все ли кандидаты имеют одинаковые location, category, incident
-            locations = set(c.get('location_type') for c in filtered_candidates if c.get('location_type'))
-            categories = set(c.get('category') for c in filtered_candidates if c.get('category'))
-            incidents = set(c.get('incident_type') for c in filtered_candidates if c.get('incident_type'))
-
-            if len(locations) == 1 and len(categories) == 1 and len(incidents) == 1:
-                # Все кандидаты имеют одинаковые атрибуты - уточняем по описанию
-                names = [c.get('service_name', c.get('scenario_name', 'Unknown')) for c in filtered_candidates]
-                logger.info(f"Кандидаты имеют одинаковые атрибуты, уточняем: {names}")
-
-                # Генерируем вопрос на основе названий
-                if len(names) <= 3:
-                    return {
-                        'status': 'AMBIGUOUS',
-                        'message': f"Уточните, пожалуйста, что именно произошло:\n• " + "\n• ".join(names),
-                        'single_candidate': None,
-                        'filtered_candidates': filtered_candidates
-                    }
+        # Если осталось 0 кандидатов после фильтрации - используем оригинальный список
+        # Уникальные значения измерений уже собраны при фильтрации и используются
+        # и для проверки одинаковых атрибутов, и для анализа по приоритетам
+        filtered_out_all = not filtered_candidates
+        if filtered_out_all:
+            logger.warning("После фильтрации не осталось кандидатов, используем полный список")
+            filtered_candidates = candidates_with_attrs
+            location_types, categories, incident_types = _collect_triple(filtered_candidates)
 
-                # Если кандидатов много - возвращаем общий вопрос
+        # ИСПРАВЛЕНО: Если осталось несколько кандидатов с одинаковыми атрибутами - пробуем уточнить по keywords
+        if (not filtered_out_all and len(filtered_candidates) > 1
+                and len(location_types) == 1 and len(categories) == 1 and len(incident_types) == 1):
+            # Все кандидаты имеют одинаковые атрибуты - уточняем по описанию
+            names = [c['_display_name'] for c in filtered_candidates]
+            logger.info(f"Кандидаты имеют одинаковые атрибуты, уточняем: {names}")
+
+            # Генерируем вопрос на основе названий
+            if len(names) <= 3:
                 return {
                     'status': 'AMBIGUOUS',
-                    'message': f"Уточните, пожалуйста, детали проблемы (выберите один из вариантов ниже)",
+                    'message': f"Уточните, пожалуйста, что именно произошло:\n• " + "\n• ".join(names),
                     'single_candidate': None,
                     'filtered_candidates': filtered_candidates
                 }
 
-        # Если осталось 0 кандидатов после фильтрации - используем оригинальный список
-        if not filtered_candidates:
-            logger.warning("После фильтрации не осталось кандидатов, используем полный список")
-            filtered_candidates = candidates_with_attrs
-
-        # Анализируем уникальные значения по каждому измерению на основе отфильтрованных кандидатов
-        location_types = set()
-        categories = set()
-        incident_types = set()
+            # Если кандидатов много - возвращаем общий вопрос
+            return {
+                'status': 'AMBIGUOUS',
+                'message': f"Уточните, пожалуйста, детали проблемы (выберите один из вариантов ниже)",
+                'single_candidate': None,
+                'filtered_candidates': filtered_candidates
+            }
 
-        for c in filtered_candidates:
-            if c.get('location_type'):
-                location_types.add(c['location_type'])
-            if c.get('category'):
-                categories.add(c['category'])
-            if c.get('incident_type'):
-                incident_types.add(c['incident_type'])
+        # Битовые маски признаков: каждое уникальное значение классифицируется один раз
+        loc_mask = _classify_values(location_types, _LOCATION_TAGS)
+        cat_mask = _classify_values(categories, _CATEGORY_TAGS)
+        incident_mask = _classify_values(incident_types, _INCIDENT_TAGS)
 
         logger.info(f"Анализ кандидатов: locations={location_types}, categories={categories}, incidents={incident_types}")
 
@@ -1005,10 +1250,7 @@ class MainAgent:
         # Если локация уже известна - пропускаем этот вопрос
         if not known_location and len(location_types) >= 2:
             # Проверяем есть ли оба основных типа локации
-            has_individual = any('индивид' in loc.lower() or 'квартир' in loc.lower() for loc in location_types)
-            has_common = any('общедом' in loc.lower() or 'общее' in loc.lower() for loc in location_types)
-
-            if has_individual and has_common:
+            if loc_mask & _LOC_INDIVIDUAL and loc_mask & _LOC_COMMON:
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Где именно это произошло: в квартире у вас или на территории общедомового имущества?",
@@ -1035,10 +1277,7 @@ class MainAgent:
 
         # ===== ПРИОРИТЕТ 2: Тип инцидента (Инцидент vs Запрос) =====
         if len(incident_types) >= 2:
-            has_incident = any('инцид' in inc.lower() for inc in incident_types)
-            has_request = any('запрос' in inc.lower() or 'заявк' in inc.lower() for inc in incident_types)
-
-            if has_incident and has_request:
+            if incident_mask & _INC_INCIDENT and incident_mask & _INC_REQUEST:
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Уточните, пожалуйста: у вас аварийная ситуация (поломка, течь и т.п.) или вам нужна информация/услуга?",
@@ -1049,15 +1288,8 @@ class MainAgent:
         # ===== ПРИОРИТЕТ 3: Категория проблемы =====
         # Если категория уже известна - пропускаем этот вопрос
         if not known_category and len(categories) >= 2:
-            # Анализируем категории для умного вопроса
-            has_water = any('вод' in cat.lower() or 'сантехник' in cat.lower() or 'канализ' in cat.lower() for cat in categories)
-            has_heating = any('отопл' in cat.lower() for cat in categories)
-            has_electric = any('электр' in cat.lower() for cat in categories)
-            has_construct = any('конструк' in cat.lower() for cat in categories)
-            has_lift = any('лифт' in cat.lower() for cat in categories)
-
-            # Специфичные вопросы по парам категорий
-            if has_water and has_heating:
+            # Специфичные вопросы по парам категорий (cat_mask посчитана при сборе categories)
+            if cat_mask & _CAT_WATER and cat_mask & _CAT_HEATING:
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Это проблема с водой (течь, засор) или с отоплением?",
@@ -1065,7 +1297,7 @@ class MainAgent:
                     'filtered_candidates': filtered_candidates
                 }
 
-            if has_water and has_electric:
+            if cat_mask & _CAT_WATER and cat_mask & _CAT_ELECTRIC:
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Проблема с водоснабжением или с электричеством?",
@@ -1073,7 +1305,7 @@ class MainAgent:
                     'filtered_candidates': filtered_candidates
                 }
 
-            if has_lift and (has_water or has_heating or has_electric):
+            if cat_mask & _CAT_LIFT and cat_mask & (_CAT_WATER | _CAT_HEATING | _CAT_ELECTRIC):
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Проблема с лифтом или с коммуникациями (вода, свет, отопление)?",
@@ -1081,7 +1313,7 @@ class MainAgent:
                     'filtered_candidates': filtered_candidates
                 }
 
-            if has_construct and has_water:
+            if cat_mask & _CAT_CONSTRUCT and cat_mask & _CAT_WATER:
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Это проблема с конструкцией (крыша, стены) или с сантехникой?",
@@ -1105,7 +1337,7 @@ class MainAgent:
 
             # ИСПРАВЛЕНО: Генерируем простые открытые вопросы, НЕ перечисляем варианты
             # Если говорится о течи - спрашиваем где (открытый вопрос)
-            if any(word in original_lower for word in ['теч', 'течет', 'протека', 'капа', 'утечк', 'льет']):
+            if _LEAK_WORDS_RE.search(original_lower):
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Где именно это произошло? Пожалуйста, опишите подробнее.",
@@ -1114,7 +1346,7 @@ class MainAgent:
                 }
 
             # Если говорится о поломке - спрашиваем что
-            if any(word in original_lower for word in ['сломал', 'не работ', 'поломк']):
+            if _BREAKAGE_WORDS_RE.search(original_lower):
                 return {
                     'status': 'AMBIGUOUS',
                     'message': "Что именно сломалось? Опишите, пожалуйста, подробнее.",
@@ -1131,9 +1363,14 @@ class MainAgent:
                 }
 
     async def _run_ai_search(self, message_text: str) -> Dict:
-        """Запуск AIAgentService"""
+        """Запуск AIAgentService (с таймаутом, при превышении - переход к fallback)"""
         try:
-            return await self.ai_agent.search(message_text)
+            # Список услуг (пере)загружается из БД до таймаута: ai_timeout ограничивает только вызов LLM
+            await self.ai_agent.ensure_services_loaded()
+            return await asyncio.wait_for(self.ai_agent.search(message_text), timeout=self.ai_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"AIAgentService не ответил за {self.ai_timeout} с, переходим к fallback")
+            return {'status': 'TIMEOUT', 'reason': 'ai_orchestrator_timeout'}
         except Exception as e:
             logger.error(f"Ошибка AIAgentService: {e}")
             return {}
@@ -1223,10 +1460,10 @@ class MainAgent:
                 'clarification_type': 'questions'
             }
 
-        # ИСПРАВЛЕНО: Загружаем атрибуты из БД вместо пустых значений
-        candidates_with_attrs = await self._load_candidates_attributes(candidates[:3])
+        # ИСПРАВЛЕНО: Загружаем атрибуты из БД вместо пустых значений (параллельно с LLM-фильтрами)
+        candidates_with_attrs, extracted_filters = await self._load_attributes_and_filters(candidates[:3], original_message, dialog_history)
 
-        clarification_result = self._generate_smart_clarification(candidates_with_attrs, original_message, is_followup, dialog_history)
+        clarification_result = await self._generate_smart_clarification(candidates_with_attrs, original_message, is_followup, dialog_history, extracted_filters)
 
         # ИСПРАВЛЕНО: Если после фильтрации остался 1 кандидат - возвращаем SUCCESS
         if clarification_result.get('status') == 'SUCCESS' and clarification_result.get('single_candidate'):
@@ -1234,7 +1471,7 @@ class MainAgent:
             return {
                 'status': 'SUCCESS',
                 'service_id': candidate['service_id'],
-                'service_name': candidate.get('service_name', candidate.get('scenario_name', 'Unknown')),
+                'service_name': candidate['_display_name'],
                 'confidence': 1.0,
                 'source': 'filtered_search',
                 'message': clarification_result['message'],
@@ -1248,8 +1485,8 @@ class MainAgent:
 
         return {
             'status': 'AMBIGUOUS',
-            'candidates': filtered_candidates,  # ИСПРАВЛЕНО: отфильтрованные кандидаты
-            'candidate_names': [c.get('service_name', c.get('scenario_name', 'Unknown')) for c in filtered_candidates],
+            'candidates': _public_candidates(filtered_candidates),  # ИСПРАВЛЕНО: отфильтрованные кандидаты
+            'candidate_names': [c['_display_name'] for c in filtered_candidates],
             'message': clarification_result['message'],
             'needs_clarification': True,
             'clarification_type': 'context',
@@ -1285,73 +1522,32 @@ class MainAgent:
             'candidates': []
         }
 
-    async def _fallback_service_detection(self, message_text: str, address_components: Dict = None) -> Dict:
+    async def _fallback_service_detection(self, message_text: str, address_patch: Dict = None) -> Dict:
         """
         Запасной метод определения услуг по ключевым словам
 
         ИСПРАВЛЕНО: Сделано async для вызова _create_ambiguous_result
-        ДОБАВЛЕНО: Принимает address_components для добавления к результату
+        ДОБАВЛЕНО: Принимает address_patch (адресные поля) для добавления к результату
         """
         try:
-            # Улучшенные ключевые слова для проблем с водой
-            water_keywords = ['теч', 'течет', 'протека', 'капа', 'утечк', 'льет', 'протек', 'затека', 'сырость', 'влага', 'капает', 'жидкость', 'сыро', 'мокро', 'протекает', 'течь']
-            equipment_keywords = ['сломал', 'не работает', 'испортил', 'повредил', 'поломк', 'брак']
-            heating_keywords = ['нет отопления', 'холодно', 'не греет', 'отопление не работает', 'батарея холодная']
-            electricity_keywords = ['нет света', 'света нет', 'выключили свет', 'нет электричества', 'электричество']
-            lift_keywords = ['лифт', 'лифта', 'лифтом', 'лифт не работает']
-
             message_lower = message_text.lower()
 
-            if any(keyword in message_lower for keyword in water_keywords):
-                # ИСПРАВЛЕНО: Возвращаем AMBIGUOUS вместо SUCCESS чтобы задать уточняющий вопрос
-                return {
-                    'status': 'AMBIGUOUS',
-                    'candidates': [],
-                    'candidate_names': [],
-                    'message': 'Понял, у вас течь. Где именно это произошло? Пожалуйста, опишите подробнее.',
-                    'needs_clarification': True,
-                    'clarification_type': 'water'
-                }
-            elif any(keyword in message_lower for keyword in equipment_keywords):
-                return {
-                    'status': 'AMBIGUOUS',
-                    'candidates': [],
-                    'candidate_names': [],
-                    'message': 'Понимаю, у вас поломка оборудования. Что именно сломалось и где это произошло? Опишите подробнее.',
-                    'needs_clarification': True,
-                    'clarification_type': 'equipment'
-                }
-            elif any(keyword in message_lower for keyword in heating_keywords):
-                return {
-                    'status': 'AMBIGUOUS',
-                    'candidates': [],
-                    'candidate_names': [],
-                    'message': 'Похоже, проблема с отоплением. Где именно это произошло? Пожалуйста, уточните детали.',
-                    'needs_clarification': True,
-                    'clarification_type': 'heating'
-                }
-            elif any(keyword in message_lower for keyword in electricity_keywords):
-                return {
-                    'status': 'AMBIGUOUS',
-                    'candidates': [],
-                    'candidate_names': [],
-                    'message': 'Похоже, проблема с электричеством. Где именно это произошло? Опишите подробнее ситуацию.',
-                    'needs_clarification': True,
-                    'clarification_type': 'electricity'
-                }
-            elif any(keyword in message_lower for keyword in lift_keywords):
+            # Первая по приоритету категория, чья альтернация нашлась в сообщении (_FALLBACK_PATTERNS)
+            category = next(
+                (name for name, pattern in _FALLBACK_PATTERNS if pattern.search(message_lower)),
+                None
+            )
+
+            # ИСПРАВЛЕНО: Для воды/оборудования/отопления/электричества возвращаем AMBIGUOUS
+            # вместо SUCCESS, чтобы задать уточняющий вопрос
+            if category is not None:
                 result = {
-                    'status': 'SUCCESS',
-                    'service_id': 42,
-                    'service_name': 'Лифт не работает, двери застряли, люди внутри',
-                    'confidence': 0.9,
-                    'source': 'fallback_detection',
-                    'message': 'Я определил, что у вас проблема: Лифт не работает',
-                    'candidates': []
+                    key: list(value) if isinstance(value, list) else value
+                    for key, value in _FALLBACK_RESULTS[category].items()
                 }
-                # ДОБАВЛЕНО: Добавляем адресные компоненты
-                if address_components:
-                    result = self._add_address_to_result(result, address_components)
+                # ДОБАВЛЕНО: Добавляем адресные компоненты (только к определенной услуге)
+                if result['status'] == 'SUCCESS' and address_patch:
+                    result.update(address_patch)
                 return result
 
             # Если не смогли определить проблему
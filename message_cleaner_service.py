@@ -18,11 +18,29 @@ MessageCleanerService - сервис очистки сообщений от му
 
 import logging
 import re
+from functools import lru_cache
 from typing import Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
+def _compile_by_first_char(words, tail: str) -> Dict[str, re.Pattern]:
+    """
+    Группировка слов по первой букве: {буква: '^(?:слово1|слово2...)' + tail}
+
+    Для строки проверяется только группа ее первой буквы, остальные альтернативы
+    движок regex не перебирает вовсе. Слова приводятся к нижнему регистру, паттерны
+    без re.IGNORECASE - сопоставлять нужно со строкой в нижнем регистре
+    """
+    groups = {}
+    for word in sorted((w.lower() for w in words), key=len, reverse=True):
+        groups.setdefault(word[0], []).append(re.escape(word))
+    return {
+        char: re.compile(r'^(?:' + '|'.join(alternatives) + r')' + tail)
+        for char, alternatives in groups.items()
+    }
+
+
 class MessageCleanerService:
     """
     Сервис очистки сообщений от мусора перед передачей в поиск
@@ -48,11 +66,57 @@ class MessageCleanerService:
     ]
 
     # Стоп-слова в начале (предлоги, союзы, местоимения)
-    PREFIX_STOP_WORDS = [
+    PREFIX_STOP_WORDS = frozenset([
         'а', 'но', 'да', 'нет', 'ну', 'же', 'ли', 'ведь',
         'просто', 'просто-', 'лишь', 'только', 'честно',
         'вообще', 'в принципе', 'собственно', 'итак'
-    ]
+    ])
+
+    # ИСПРАВЛЕНО: Паттерны компилируются один раз при загрузке класса, а не на каждый вызов.
+    # Приветствия - по альтернативе на первую букву (длинные первыми), заполнители - одна
+    # альтернатива вместо пары re.sub на каждое слово
+    GREETING_RE_BY_CHAR = _compile_by_first_char(GREETINGS, r'[!,.\s]+')
+    # Приветствия в нижнем регистре для быстрой проверки str.startswith (без regex)
+    GREETINGS_LOWER = tuple(g.lower() for g in GREETINGS)
+    # Запасной вариант для строк, у которых lower() меняет длину (редкие символы Unicode):
+    # там позиции совпадения в нижнем регистре не совпадают с исходной строкой
+    GREETING_RE_ICASE = re.compile(
+        r'^(?:' + '|'.join(re.escape(g) for g in sorted(GREETINGS, key=len, reverse=True)) + r')[!,.\s]+',
+        re.IGNORECASE
+    )
+    # До 3 стоп-слов подряд в начале; каждое слово может быть обрамлено знаками ,!?.-
+    PREFIX_RE = re.compile(
+        r'^\s*(?:[,!?.\-]*(?:'
+        + '|'.join(re.escape(w) for w in sorted(PREFIX_STOP_WORDS, key=len, reverse=True))
+        + r')[,!?.\-]*(?:\s+|$)){1,3}',
+        re.IGNORECASE
+    )
+    # Базовый список стоп-слов для get_meaningful_words (можно расширить)
+    STOP_WORDS = frozenset({
+        'и', 'в', 'во', 'не', 'что', 'он', 'на', 'с', 'я',
+        'как', 'а', 'то', 'все', 'она', 'так', 'его', 'из',
+        'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее',
+        'мне', 'было', 'вот', 'от', 'меня', 'еще', 'нет',
+        'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну',
+        'вдруг', 'ли', 'если', 'уже', 'или', 'ни', 'быть',
+        'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж',
+        'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей',
+        'может', 'они', 'тут', 'где', 'есть', 'надо', 'ней',
+        'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб'
+    })
+    # Слово целиком (\b\w+\b == \w+: последовательность \w всегда ограничена границами слова)
+    WORD_RE = re.compile(r'\w+')
+
+    # Первые символы, с которых может начинаться стоп-слово (с учетом знаков ,!?.-)
+    PREFIX_FIRST_CHARS = frozenset(w[0] for w in PREFIX_STOP_WORDS) | frozenset(',!?.-')
+    # Однословные приветствия - точное совпадение слова проверяется без regex
+    GREETING_WORDS = frozenset(g for g in GREETINGS if ' ' not in g)
+    # Любое вхождение приветствия внутри слова (для is_greeting_only)
+    GREETING_CONTAINS_RE = re.compile('|'.join(map(re.escape, GREETINGS)))
+    FILLER_RE = re.compile(
+        r'\b(?:' + '|'.join(map(re.escape, FILLER_WORDS)) + r')[,-]?\s+',
+        re.IGNORECASE
+    )
 
     def __init__(self, ai_agent_service=None):
         """
@@ -62,6 +126,9 @@ class MessageCleanerService:
             ai_agent_service: Опционально, сервис для LLM-очистки
         """
         self.ai_agent = ai_agent_service
+        # ДОБАВЛЕНО: Базовая очистка детерминирована - повторяющиеся сообщения ("привет",
+        # "здравствуйте" и т.п.) берем из кэша без прогона regex
+        self._clean_basic = lru_cache(maxsize=2048)(self._clean_basic_uncached)
         logger.info("MessageCleanerService инициализирован")
 
     def clean_message(self, message_text: str, use_llm: bool = False) -> Tuple[str, Dict]:
@@ -87,33 +154,19 @@ class MessageCleanerService:
             return message_text, {'error': 'Invalid input'}
 
         original_text = message_text
-        cleaned_text = message_text.strip()
+        stripped_text = message_text.strip()
+
+        # Шаги 1-3: базовая очистка (кэшируется по тексту)
+        cleaned_text, (removed_greeting, removed_fillers, removed_prefixes) = self._clean_basic(stripped_text)
         metadata = {
             'original_length': len(original_text),
-            'cleaned_length': len(cleaned_text),
-            'removed_greeting': False,
-            'removed_fillers': False,
-            'removed_prefixes': False,
+            'cleaned_length': len(stripped_text),
+            'removed_greeting': removed_greeting,
+            'removed_fillers': removed_fillers,
+            'removed_prefixes': removed_prefixes,
             'llm_used': False
         }
 
-        # Шаг 1: Базовая очистка - удаление приветствий
-        cleaned_text = self._remove_greetings(cleaned_text)
-        if cleaned_text != original_text.strip():
-            metadata['removed_greeting'] = True
-
-        # Шаг 2: Удаление слов-заполнителей
-        before_filler = cleaned_text
-        cleaned_text = self._remove_filler_words(cleaned_text)
-        if cleaned_text != before_filler:
-            metadata['removed_fillers'] = True
-
-        # Шаг 3: Удаление стоп-слов в начале
-        before_prefix = cleaned_text
-        cleaned_text = self._remove_prefix_stop_words(cleaned_text)
-        if cleaned_text != before_prefix:
-            metadata['removed_prefixes'] = True
-
         # Шаг 4: LLM-очистка (если включено и доступен AI)
         if use_llm and self.ai_agent:
             cleaned_text = self._llm_clean(cleaned_text, metadata)
@@ -132,6 +185,29 @@ class MessageCleanerService:
 
         return cleaned_text, metadata
 
+    def _clean_basic_uncached(self, text: str) -> Tuple[str, Tuple[bool, bool, bool]]:
+        """
+        Базовая очистка без LLM (результат кэшируется в self._clean_basic)
+
+        Returns:
+            Tuple: (очищенный текст, (removed_greeting, removed_fillers, removed_prefixes))
+        """
+        # Шаг 1: Базовая очистка - удаление приветствий
+        cleaned_text = self._remove_greetings(text)
+        removed_greeting = cleaned_text != text
+
+        # Шаг 2: Удаление слов-заполнителей
+        before_filler = cleaned_text
+        cleaned_text = self._remove_filler_words(cleaned_text)
+        removed_fillers = cleaned_text != before_filler
+
+        # Шаг 3: Удаление стоп-слов в начале
+        before_prefix = cleaned_text
+        cleaned_text = self._remove_prefix_stop_words(cleaned_text)
+        removed_prefixes = cleaned_text != before_prefix
+
+        return cleaned_text, (removed_greeting, removed_fillers, removed_prefixes)
+
     def _remove_greetings(self, text: str) -> str:
         """
         Удаление приветствий из начала сообщения
@@ -141,27 +217,30 @@ class MessageCleanerService:
         - "Здравствуйте, у меня..." -> "у меня..."
         - "Добрый день. Проблема..." -> "Проблема..."
         """
-        lines = text.split('\n')
-        first_line = lines[0].strip()
-
-        for greeting in self.GREETINGS:
-            # Проверяем начало строки
-            patterns = [
-                f'^{re.escape(greeting)}[!,.\\s]+',
-                f'^{re.escape(greeting)}\\s+[!,.]*\\s*',
-            ]
-
-            for pattern in patterns:
-                match = re.match(pattern, first_line, re.IGNORECASE)
-                if match:
-                    # Удаляем приветствие
-                    first_line = first_line[match.end():].strip()
-                    # Если первая строка стала пустой - удаляем её
-                    if not first_line and len(lines) > 1:
-                        lines = lines[1:]
-                    else:
-                        lines[0] = first_line
-                    return '\n'.join(lines)
+        # Приветствие бывает только в первой строке - остальной текст не разбиваем на строки
+        newline_idx = text.find('\n')
+        first_line = (text if newline_idx < 0 else text[:newline_idx]).strip()
+
+        # Проверяем начало строки: только приветствия на ту же букву. Строку приводим к нижнему
+        # регистру один раз - паттерны без re.IGNORECASE, а срез берется из исходной строки
+        first_line_lower = first_line.lower()
+        pattern = self.GREETING_RE_BY_CHAR.get(first_line_lower[:1])
+        # Строка не начинается ни с одного приветствия - regex не нужен (одна проверка в C)
+        if pattern is None or not first_line_lower.startswith(self.GREETINGS_LOWER):
+            match = None
+        elif len(first_line_lower) == len(first_line):
+            match = pattern.match(first_line_lower)
+        else:
+            match = self.GREETING_RE_ICASE.match(first_line)
+        if match:
+            # Удаляем приветствие
+            first_line = first_line[match.end():].strip()
+            if newline_idx < 0:
+                return first_line
+            # Если первая строка стала пустой - удаляем её
+            if not first_line:
+                return text[newline_idx + 1:]
+            return first_line + text[newline_idx:]
 
         return text
 
@@ -173,19 +252,14 @@ class MessageCleanerService:
         - "Короче, у меня..." -> "у меня..."
         - "Смотрите, проблема..." -> "проблема..."
         """
-        cleaned = text
-
-        for filler in self.FILLER_WORDS:
-            # Удаляем с запятой или без
-            patterns = [
-                f'\\b{re.escape(filler)},?\\s+',
-                f'\\b{re.escape(filler)}-?\\s+',
-            ]
+        # Дешевая проверка подстрокой: в большинстве сообщений заполнителей нет,
+        # и regex-проход по всему тексту не нужен
+        text_lower = text.lower()
+        if not any(filler in text_lower for filler in self.FILLER_WORDS):
+            return text.strip()
 
-            for pattern in patterns:
-                cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
-
-        return cleaned.strip()
+        # Удаляем с запятой/дефисом или без - один проход по тексту
+        return self.FILLER_RE.sub('', text).strip()
 
     def _remove_prefix_stop_words(self, text: str) -> str:
         """
@@ -196,24 +270,17 @@ class MessageCleanerService:
         - "Просто проблема..." -> "проблема..."
         - "Ну вообще..." -> "вообще..." (или удалено если далее ключевое слово)
         """
-        words = text.split()
-
-        # Удаляем стоп-слова из начала (максимум 3 подряд)
-        removed_count = 0
-        max_prefix_removal = 3
-
-        for word in words[:max_prefix_removal + 5]:
-            if removed_count >= max_prefix_removal:
-                break
-
-            word_lower = word.lower().strip(',!?.-')
-            if word_lower in self.PREFIX_STOP_WORDS:
-                removed_count += 1
-            else:
-                break
-
-        if removed_count > 0:
-            return ' '.join(words[removed_count:])
+        # Первая буква не начинает ни одно стоп-слово - regex не запускаем
+        first_char = text[:1].lower()
+        if first_char not in self.PREFIX_FIRST_CHARS and not first_char.isspace():
+            return text
+
+        # Удаляем стоп-слова из начала (максимум 3 подряд) одним якорным regex,
+        # без разбиения всего текста на слова
+        match = self.PREFIX_RE.match(text)
+        if match:
+            # Как и раньше, остаток после удаления нормализуется по пробелам
+            return ' '.join(text[match.end():].split())
 
         return text
 
@@ -270,13 +337,14 @@ class MessageCleanerService:
             return False
 
         cleaned = text.strip().lower()
-        words = re.findall(r'\b\w+\b', cleaned)
+        words = self.WORD_RE.findall(cleaned)
 
-        # Если слов мало и все они приветствия
+        # Если слов мало и все они приветствия: сначала точное совпадение по множеству,
+        # поиск приветствия внутри слова - только для остальных; all() обрывается на первом
         if len(words) <= 3:
-            greeting_words = [w for w in words if any(g in w for g in self.GREETINGS)]
-            if len(greeting_words) == len(words):
-                return True
+            greeting_words = self.GREETING_WORDS
+            search = self.GREETING_CONTAINS_RE.search
+            return all(w in greeting_words or search(w) for w in words)
 
         return False
 
@@ -299,22 +367,8 @@ class MessageCleanerService:
         if not text:
             return []
 
-        # Базовый список стоп-слов (можно расширить)
-        stop_words = {
-            'и', 'в', 'во', 'не', 'что', 'он', 'на', 'с', 'я',
-            'как', 'а', 'то', 'все', 'она', 'так', 'его', 'из',
-            'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее',
-            'мне', 'было', 'вот', 'от', 'меня', 'еще', 'нет',
-            'о', 'из', 'ему', 'теперь', 'когда', 'даже', 'ну',
-            'вдруг', 'ли', 'если', 'уже', 'или', 'ни', 'быть',
-            'был', 'него', 'до', 'вас', 'нибудь', 'опять', 'уж',
-            'вам', 'ведь', 'там', 'потом', 'себя', 'ничего', 'ей',
-            'может', 'они', 'тут', 'где', 'есть', 'надо', 'ней',
-            'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб'
-        }
-
-        words = re.findall(r'\b\w+\b', text.lower())
-        meaningful = [w for w in words if w not in stop_words and len(w) > 2]
+        words = self.WORD_RE.findall(text.lower())
+        meaningful = [w for w in words if len(w) > 2 and w not in self.STOP_WORDS]
 
         return meaningful
 
@@ -110,18 +110,23 @@ class MessageLog(models.Model):
         Returns:
             list: Список предыдущих сообщений в этой сессии
         """
+        # Только нужные колонки (без metadata JSON и создания объектов модели);
+        # запрос покрывается индексом (session_id, created_at)
         messages = MessageLog.objects.filter(
             session_id=self.session_id,
             created_at__lt=self.created_at
-        ).order_by('-created_at')[:limit]
+        ).order_by('-created_at').values('direction', 'text', 'created_at', 'channel')[:limit]
 
-        # Конвертируем в формат для LLM
-        return [
+        # Конвертируем в формат для LLM: обходим выборку в прямом порядке и
+        # разворачиваем готовый список на месте (без reversed() по QuerySet через __getitem__)
+        history = [
             {
-                'role': 'user' if msg.direction == 'inbound' else 'bot',
-                'text': msg.text,
-                'timestamp': msg.created_at.isoformat(),
-                'channel': msg.channel
+                'role': 'user' if msg['direction'] == 'inbound' else 'bot',
+                'text': msg['text'],
+                'timestamp': msg['created_at'].isoformat(),
+                'channel': msg['channel']
             }
-            for msg in reversed(messages)
+            for msg in messages
         ]
+        history.reverse()
+        return history
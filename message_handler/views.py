@@ -10,11 +10,43 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import async_to_sync
 import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# ДОБАВЛЕНО: MainAgent и MessageHandlerService создаются один раз на процесс, а не на
+# каждый запрос (инициализация микросервисов, загрузка конфигурации). Состояние у них -
+# только кэши, поэтому экземпляр можно разделять между запросами
+_message_handler = None
+_history_handler = None
+_init_lock = threading.Lock()
+
+
+def _get_message_handler():
+    """Ленивая инициализация общего MessageHandlerService (с MainAgent)"""
+    global _message_handler
+    if _message_handler is None:
+        with _init_lock:
+            if _message_handler is None:
+                from message_handler_service import MessageHandlerService
+                from main_agent import MainAgent
+                _message_handler = MessageHandlerService(main_agent=MainAgent())
+    return _message_handler
+
+
+def _get_history_handler():
+    """Ленивая инициализация MessageHandlerService без MainAgent (только чтение истории)"""
+    global _history_handler
+    if _history_handler is None:
+        with _init_lock:
+            if _history_handler is None:
+                from message_handler_service import MessageHandlerService
+                _history_handler = MessageHandlerService()
+    return _history_handler
+
 
 @login_required
 def chat_interface(request):
@@ -71,33 +103,19 @@ def send_message(request):
                 'error': 'Пустое сообщение'
             }, status=400)
 
-        # Импортируем MessageHandlerService и MainAgent
-        from message_handler_service import MessageHandlerService
-        from main_agent import MainAgent
-
-        # Инициализируем сервисы (можно оптимизировать через singleton)
-        main_agent = MainAgent()
-        message_handler = MessageHandlerService(main_agent=main_agent)
+        # Сервисы общие для процесса (singleton)
+        message_handler = _get_message_handler()
 
         # Обрабатываем сообщение через MessageHandlerService
-        import asyncio
-
-        # Запускаем асинхронную обработку
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            result = loop.run_until_complete(
-                message_handler.handle_incoming_message(
-                    text=message_text,
-                    user_id=str(request.user.id),
-                    channel='web',
-                    session_id=session_id,
-                    django_user_id=request.user.id
-                )
-            )
-        finally:
-            loop.close()
+        # ИСПРАВЛЕНО: async_to_sync вместо нового event loop на каждый запрос - sync_to_async
+        # внутри сервисов возвращается в поток запроса (корректная работа с соединением БД)
+        result = async_to_sync(message_handler.handle_incoming_message)(
+            text=message_text,
+            user_id=str(request.user.id),
+            channel='web',
+            session_id=session_id,
+            django_user_id=request.user.id
+        )
 
         # Формируем ответ для клиента
         response_data = {
@@ -136,25 +154,14 @@ def get_chat_history(request):
         JsonResponse: История сообщений сессии
     """
     try:
-        from message_handler_service import MessageHandlerService
-        import asyncio
-
         session_id = request.GET.get('session_id', f"web_{request.user.id}")
         limit = int(request.GET.get('limit', 50))
 
-        # Инициализируем MessageHandlerService (без MainAgent для этой функции)
-        message_handler = MessageHandlerService()
+        # MessageHandlerService без MainAgent: get_session_messages агент не нужен
+        message_handler = _get_history_handler()
 
         # Получаем историю асинхронно
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            messages = loop.run_until_complete(
-                message_handler.get_session_messages(session_id, limit)
-            )
-        finally:
-            loop.close()
+        messages = async_to_sync(message_handler.get_session_messages)(session_id, limit)
 
         return JsonResponse({
             'status': 'success',
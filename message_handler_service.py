@@ -20,7 +20,6 @@ import uuid
 import asyncio
 from typing import Dict, Optional, Any
 from datetime import datetime
-from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
@@ -150,12 +149,12 @@ class MessageHandlerService:
 
             # Вызываем MainAgent
             # ИСПРАВЛЕНО: is_followup=True если есть предыдущие сообщения пользователя кроме приветствий
-            user_messages = [m for m in dialog_history if m.get('role') == 'user']
-
             # ИСПРАВЛЕНО (2025-12-25): Исключаем приветствия из контекста
+            # Один проход по истории: роль и приветствие проверяются для сообщения сразу
             non_greeting_messages = [
-                m for m in user_messages
-                if not self.message_cleaner or not self.message_cleaner.is_greeting_only(m.get('text', ''))
+                m for m in dialog_history
+                if m.get('role') == 'user'
+                and (not self.message_cleaner or not self.message_cleaner.is_greeting_only(m.get('text', '')))
             ]
 
             is_followup = len(non_greeting_messages) > 1
@@ -235,33 +234,31 @@ class MessageHandlerService:
             from message_handler.models import MessageLog
             from django.contrib.auth import get_user_model
 
-            def log_sync():
-                # Находим пользователя Django если передан ID
-                django_user = None
-                if django_user_id:
-                    User = get_user_model()
-                    try:
-                        django_user = User.objects.get(id=django_user_id)
-                    except User.DoesNotExist:
-                        pass
-
-                # Создаем запись
-                log_entry = MessageLog.objects.create(
-                    channel=channel,
-                    direction=direction,
-                    message_id=message_id,
-                    user_id=user_id,
-                    session_id=session_id,
-                    text=text,
-                    metadata=metadata or {},
-                    django_user=django_user
-                )
-                return {
-                    'id': log_entry.id,
-                    'created_at': log_entry.created_at.isoformat()
-                }
-
-            return await sync_to_async(log_sync)()
+            # Нативный async ORM (aget/acreate) вместо sync_to_async-обертки
+            # Находим пользователя Django если передан ID
+            django_user = None
+            if django_user_id:
+                User = get_user_model()
+                try:
+                    django_user = await User.objects.aget(id=django_user_id)
+                except User.DoesNotExist:
+                    pass
+
+            # Создаем запись
+            log_entry = await MessageLog.objects.acreate(
+                channel=channel,
+                direction=direction,
+                message_id=message_id,
+                user_id=user_id,
+                session_id=session_id,
+                text=text,
+                metadata=metadata or {},
+                django_user=django_user
+            )
+            return {
+                'id': log_entry.id,
+                'created_at': log_entry.created_at.isoformat()
+            }
 
         except Exception as e:
             logger.error(f"MessageHandler: Ошибка логирования: {e}")
@@ -285,21 +282,24 @@ class MessageHandlerService:
         try:
             from message_handler.models import MessageLog
 
-            def get_history_sync():
-                messages = MessageLog.objects.filter(
+            # Только нужные колонки, без metadata JSON и объектов модели
+            messages = [
+                msg async for msg in MessageLog.objects.filter(
                     session_id=session_id
-                ).order_by('-created_at')[:limit]
-
-                return [
-                    {
-                        'role': 'user' if msg.direction == 'inbound' else 'bot',
-                        'text': msg.text,
-                        'timestamp': msg.created_at.isoformat()
-                    }
-                    for msg in reversed(messages)
-                ]
+                ).order_by('-created_at').values('direction', 'text', 'created_at')[:limit]
+            ]
 
-            return await sync_to_async(get_history_sync)()
+            # text_lower считаем один раз здесь: история проверяется на приветствия
+            # и в MessageHandlerService, и в MainAgent (followup)
+            return [
+                {
+                    'role': 'user' if msg['direction'] == 'inbound' else 'bot',
+                    'text': msg['text'],
+                    'text_lower': msg['text'].lower(),
+                    'timestamp': msg['created_at'].isoformat()
+                }
+                for msg in reversed(messages)
+            ]
 
         except Exception as e:
             logger.error(f"MessageHandler: Ошибка получения истории: {e}")
@@ -365,24 +365,19 @@ class MessageHandlerService:
         try:
             from message_handler.models import MessageLog
 
-            def get_messages_sync():
-                messages = MessageLog.objects.filter(
+            return [
+                {
+                    'id': msg.id,
+                    'channel': msg.get_channel_display(),
+                    'direction': msg.get_direction_display(),
+                    'text': msg.text,
+                    'timestamp': msg.created_at.isoformat(),
+                    'metadata': msg.metadata
+                }
+                async for msg in MessageLog.objects.filter(
                     session_id=session_id
                 ).order_by('created_at')[:limit]
-
-                return [
-                    {
-                        'id': msg.id,
-                        'channel': msg.get_channel_display(),
-                        'direction': msg.get_direction_display(),
-                        'text': msg.text,
-                        'timestamp': msg.created_at.isoformat(),
-                        'metadata': msg.metadata
-                    }
-                    for msg in messages
-                ]
-
-            return await sync_to_async(get_messages_sync)()
+            ]
 
         except Exception as e:
             logger.error(f"MessageHandler: Ошибка получения сообщений сессии: {e}")
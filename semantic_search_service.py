@@ -8,6 +8,7 @@ SemanticSearchService - логико-семантический микросер
 
 import logging
 import re
+import time
 from typing import List, Dict, Set
 from django.db import connection
 from asgiref.sync import sync_to_async
@@ -21,6 +22,10 @@ class SemanticSearchService:
 
     def __init__(self):
         self.service_cache = None
+        # ДОБАВЛЕНО: Экземпляр живет весь процесс (общий MainAgent в views), поэтому кэш услуг
+        # перечитывается из services_catalog по TTL, а не один раз на все время работы
+        self.services_cache_ttl = 300  # Секунд до перезагрузки кэша услуг
+        self._services_loaded_at = 0.0
         self.morph = None
         self.semantic_patterns = self._init_semantic_patterns()
         self._ensure_patterns_normalized()
@@ -193,11 +198,13 @@ class SemanticSearchService:
                 return services
 
             self.service_cache = await sync_to_async(load_sync)()
+            self._services_loaded_at = time.monotonic()
             logger.info(f"SemanticSearchService: загружено {len(self.service_cache)} услуг из services_catalog")
 
         except Exception as e:
             logger.error(f"Ошибка загрузки услуг: {e}")
-            self.service_cache = {}
+            # Неудачную загрузку не кэшируем: следующий запрос попробует снова
+            self.service_cache = None
 
     def _analyze_semantic_features(self, text: str) -> Dict:
         """Анализ семантических признаков текста с морфологией"""
@@ -308,6 +315,11 @@ class SemanticSearchService:
 
         return service_scores
 
+    async def ensure_services_loaded(self) -> None:
+        """Загружает услуги, если они еще не загружены или кэш устарел (services_cache_ttl)"""
+        if self.service_cache is None or time.monotonic() - self._services_loaded_at > self.services_cache_ttl:
+            await self._load_services()
+
     async def search(self, message_text: str) -> Dict:
         """
         Основной метод семантического поиска
@@ -321,9 +333,8 @@ class SemanticSearchService:
         try:
             logger.info(f"SemanticSearch: анализ текста '{message_text[:50]}...'")
 
-            # Загружаем услуги если еще не загружены
-            if self.service_cache is None:
-                await self._load_services()
+            # Загружаем услуги если еще не загружены или кэш устарел
+            await self.ensure_services_loaded()
 
             if not self.service_cache:
                 return {'candidates': [], 'error': 'Услуги не загружены'}
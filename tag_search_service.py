@@ -9,6 +9,7 @@ TagSearchService - микросервис поиска услуг по тега
 
 import logging
 import re
+import time
 from typing import List, Dict, Set
 from django.db import connection
 from asgiref.sync import sync_to_async
@@ -23,6 +24,10 @@ class TagSearchService:
 
     def __init__(self):
         self.service_cache = None
+        # ДОБАВЛЕНО: Экземпляр живет весь процесс (общий MainAgent в views), поэтому кэш услуг
+        # перечитывается из services_catalog по TTL, а не один раз на все время работы
+        self.services_cache_ttl = 300  # Секунд до перезагрузки кэша услуг
+        self._services_loaded_at = 0.0
         self.morph = None
         logger.info("TagSearchService инициализирован")
 
@@ -85,11 +90,13 @@ class TagSearchService:
                     return service_cache
 
             self.service_cache = await sync_to_async(load_sync)()
+            self._services_loaded_at = time.monotonic()
             logger.info(f"TagSearchService: загружено {len(self.service_cache)} услуг из services_catalog")
 
         except Exception as e:
             logger.error(f"Ошибка загрузки услуг: {e}")
-            self.service_cache = {}
+            # Неудачную загрузку не кэшируем: следующий запрос попробует снова
+            self.service_cache = None
 
     def _tokenize_text(self, text: str) -> List[str]:
         """Разбивает текст на слова, убирая лишние символы"""
@@ -110,14 +117,18 @@ class TagSearchService:
         # Предлоги и союзы ("и", "в", "на", "у") - 1-2 буквы - отсеиваем
         return [w for w in words if len(w) > 2]
 
+    async def ensure_services_loaded(self) -> None:
+        """Загружает услуги, если они еще не загружены или кэш устарел (services_cache_ttl)"""
+        if self.service_cache is None or time.monotonic() - self._services_loaded_at > self.services_cache_ttl:
+            await self._load_services()
+
     async def search(self, message_text: str) -> Dict:
         """
         Основной метод поиска услуги по тексту сообщения
         Возвращает JSON с множеством service_id (по ТЗ)
         """
         try:
-            if not self.service_cache:
-                await self._load_services()
+            await self.ensure_services_loaded()
 
             if not self.service_cache:
                 return {"status": "error", "message": "Нет загруженных услуг", "candidates": []}
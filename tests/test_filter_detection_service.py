@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Unit-тесты для FilterDetectionService.detect_and_rank
+Вызов LLM подменяется заглушкой AIAgentService, БД и API не нужны
+"""
+
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filter_detection_service import FilterDetectionService
+
+
+CANDIDATES = [
+    {'service_id': 101, 'service_name': 'Протечка крана в квартире', 'category': 'Сантехника', 'location_type': 'Индивидуальное'},
+    {'service_id': 202, 'service_name': 'Протечка стояка', 'category': 'Сантехника', 'location_type': 'Общедомовое'},
+]
+
+
+class StubAIAgent:
+    """Заглушка AIAgentService: возвращает заданный ответ и запоминает промпты"""
+
+    def __init__(self, response_text):
+        self.response_text = response_text
+        self.prompts = []
+
+    async def _call_yandex_gpt(self, prompt):
+        self.prompts.append(prompt)
+        return self.response_text, {'total_tokens': 0}
+
+
+def llm_answer(recommended_id):
+    """Ответ LLM в формате промпта detect_and_rank"""
+    return json.dumps({
+        'incident_type': 'Инцидент',
+        'location_type': 'Индивидуальное',
+        'category': 'Сантехника',
+        'object_description': 'кран на кухне',
+        'confidence': 0.9,
+        'reason': 'течет кран в квартире',
+        'recommended_id': recommended_id,
+        'ranking_confidence': 0.8
+    }, ensure_ascii=False)
+
+
+class TestDetectAndRank(unittest.IsolatedAsyncioTestCase):
+    """Тесты объединенного определения фильтров и ранжирования"""
+
+    async def test_valid_recommended_id(self):
+        """ID из списка кандидатов возвращается вместе с фильтрами"""
+        ai_agent = StubAIAgent(llm_answer(101))
+        service = FilterDetectionService(ai_agent_service=ai_agent)
+
+        result = await service.detect_and_rank('течет кран на кухне', CANDIDATES, [])
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['recommended_id'], 101)
+        self.assertEqual(result['ranking_confidence'], 0.8)
+        self.assertEqual(result['filters']['location_type'], 'Индивидуальное')
+        self.assertEqual(result['filters']['category'], 'Сантехника')
+        # Кандидаты попадают в тот же промпт - второго вызова LLM нет
+        self.assertEqual(len(ai_agent.prompts), 1)
+        self.assertIn('ID:101', ai_agent.prompts[0])
+        self.assertIn('ID:202', ai_agent.prompts[0])
+
+    async def test_recommended_id_not_in_candidates(self):
+        """ID не из списка кандидатов отбрасывается, фильтры сохраняются"""
+        service = FilterDetectionService(ai_agent_service=StubAIAgent(llm_answer(999)))
+
+        result = await service.detect_and_rank('течет кран на кухне', CANDIDATES, [])
+
+        self.assertEqual(result['status'], 'success')
+        self.assertIsNone(result['recommended_id'])
+        self.assertEqual(result['filters']['incident_type'], 'Инцидент')
+
+    async def test_malformed_json(self):
+        """Нераспарсиваемый ответ LLM - ошибка, результат не кэшируется"""
+        ai_agent = StubAIAgent('{"incident_type": "Инцидент", "recommended_id": ')
+        service = FilterDetectionService(ai_agent_service=ai_agent)
+
+        result = await service.detect_and_rank('течет кран на кухне', CANDIDATES, [])
+
+        self.assertEqual(result['status'], 'error')
+        self.assertNotIn('recommended_id', result)
+        self.assertEqual(len(service.result_cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
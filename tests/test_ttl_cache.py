@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Unit-тесты для TTLCache
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    """Тесты времени жизни и вытеснения записей"""
+
+    def test_expired_entry_is_dropped(self):
+        """Запись старше ttl не возвращается и удаляется"""
+        cache = TTLCache(ttl=60, max_size=4)
+        with mock.patch('ttl_cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with mock.patch('ttl_cache.time.monotonic', return_value=161.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_oldest_entry_is_evicted(self):
+        """При переполнении вытесняется самая старая запись"""
+        cache = TTLCache(ttl=60, max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('a', 3)  # перезапись делает 'a' самой новой
+        cache.set('c', 4)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 3)
+        self.assertEqual(cache.get('c'), 4)
+
+    def test_zero_size_does_not_fail(self):
+        """Нулевой размер не приводит к ошибке при вытеснении"""
+        cache = TTLCache(ttl=60, max_size=0)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('b'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Небольшой in-memory кэш с временем жизни записей и ограничением размера
+
+Используется сервисами для коротких кэшей ответов LLM (ключ -> результат).
+Не потокобезопасен: экземпляр принадлежит одному сервису.
+"""
+
+import time
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """Словарь с TTL записей; при переполнении вытесняются просроченные, затем самые старые"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        # Ключ -> (время записи, значение); порядок вставки = порядок по времени записи
+        self._data = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение из кэша, если оно есть и не старше ttl"""
+        cached = self._data.get(key)
+        if cached is None:
+            return None
+        stored_at, value = cached
+        if time.monotonic() - stored_at > self.ttl:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохранение значения; при переполнении вытесняются самые старые записи"""
+        now = time.monotonic()
+        # Перезапись переносит ключ в конец, чтобы порядок оставался по времени записи
+        self._data.pop(key, None)
+        if len(self._data) >= self.max_size:
+            self._data = {k: v for k, v in self._data.items() if now - v[0] <= self.ttl}
+            while self._data and len(self._data) >= self.max_size:
+                self._data.pop(next(iter(self._data)))
+        self._data[key] = (now, value)
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -8,6 +8,7 @@ VectorSearchService - микросервис поиска услуг с триг
 
 import logging
 import re
+import time
 from typing import List, Dict, Any
 from django.db import connection
 from asgiref.sync import sync_to_async
@@ -20,6 +21,10 @@ class VectorSearchService:
 
     def __init__(self):
         self.service_cache = None
+        # ДОБАВЛЕНО: Экземпляр живет весь процесс (общий MainAgent в views), поэтому кэш услуг
+        # перечитывается из services_catalog по TTL, а не один раз на все время работы
+        self.services_cache_ttl = 300  # Секунд до перезагрузки кэша услуг
+        self._services_loaded_at = 0.0
         logger.info("VectorSearchService инициализирован")
 
     async def _load_services(self):
@@ -47,11 +52,18 @@ class VectorSearchService:
                 return service_cache
 
             self.service_cache = await sync_to_async(load_sync)()
+            self._services_loaded_at = time.monotonic()
             logger.info(f"VectorSearchService: загружено {len(self.service_cache)} услуг")
 
         except Exception as e:
             logger.error(f"Ошибка загрузки услуг: {e}")
-            self.service_cache = {}
+            # Неудачную загрузку не кэшируем: следующий запрос попробует снова
+            self.service_cache = None
+
+    async def ensure_services_loaded(self) -> None:
+        """Загружает услуги, если они еще не загружены или кэш устарел (services_cache_ttl)"""
+        if self.service_cache is None or time.monotonic() - self._services_loaded_at > self.services_cache_ttl:
+            await self._load_services()
 
     async def search(self, message_text: str) -> Dict:
         """
@@ -66,9 +78,8 @@ class VectorSearchService:
         try:
             logger.info(f"VectorSearch: поиск по тексту '{message_text[:50]}...'")
 
-            # Загружаем услуги если еще не загружены
-            if self.service_cache is None:
-                await self._load_services()
+            # Загружаем услуги если еще не загружены или кэш устарел
+            await self.ensure_services_loaded()
 
             if not self.service_cache:
                 return {'status': 'error', 'candidates': [], 'error': 'Услуги не загружены'}